@@ -0,0 +1,46 @@
+"""
+Times Memory.allocate_node, the path of every node a command creates one by one.
+"fresh" allocates every node of a new memory, "reused" frees them all and allocates them again from the avail list.
+Each node gets a label and points to the previous one. The best of REPEATS runs is printed.
+Usage:
+    python3 -m benchmarks.allocation [nodes...]
+"""
+import sys
+import time
+from garbage_collection_simulator.data_structures import Memory
+
+REPEATS = 7
+
+
+def allocate(memory, count):
+    previous = None
+    nodes = []
+    start = time.perf_counter()
+    for _ in range(count):
+        previous = memory.allocate_node(new_label = "A", new_next = previous)
+        nodes.append(previous)
+    return time.perf_counter() - start, nodes
+
+
+def time_allocation(count):
+    fresh = reused = float("inf")
+    for _ in range(REPEATS):
+        memory = Memory(count)
+        elapsed, nodes = allocate(memory, count)
+        fresh = min(fresh, elapsed)
+        for node in nodes:
+            memory.free_node(node)
+        elapsed, _ = allocate(memory, count)
+        reused = min(reused, elapsed)
+    return fresh, reused
+
+
+def main(counts):
+    print(f"{'nodes':>10} {'fresh (s)':>10} {'reused (s)':>11}")
+    for count in counts:
+        fresh, reused = time_allocation(count)
+        print(f"{count:>10} {fresh:>10.3f} {reused:>11.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [300000])
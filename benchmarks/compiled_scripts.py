@@ -0,0 +1,43 @@
+"""
+Compares a cold run of a script (parsed, validated and cached by load_script) with a warm run (loaded from the cache).
+Scripts are generated with the commands of benchmarks.parser and written to a temporary directory.
+Usage:
+    python3 -m benchmarks.compiled_scripts [lines...]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from garbage_collection_simulator.compiler import load_script, execute_instructions
+from garbage_collection_simulator.interpreter import Interpreter
+from benchmarks.parser import generate_script
+
+
+def time_run(file_path):
+    interpreter = Interpreter(1000, gc_threshold = 100)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        instructions = load_script(file_path)
+        loaded = time.perf_counter()
+        for _ in execute_instructions(interpreter, instructions):
+            pass
+        finished = time.perf_counter()
+    return loaded - start, finished - start
+
+
+def main(sizes):
+    print(f"{'lines':>10} {'cold load (s)':>14} {'cold run (s)':>13} {'warm load (s)':>14} {'warm run (s)':>13}")
+    for lines in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "script.txt")
+            with open(file_path, "w") as file:
+                file.write("\n".join(generate_script(lines)))
+            cold_load, cold_run = time_run(file_path)
+            warm_load, warm_run = time_run(file_path)
+        print(f"{lines:>10} {cold_load:>14.3f} {cold_run:>13.3f} {warm_load:>14.3f} {warm_run:>13.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10 ** 4, 10 ** 5, 10 ** 6])
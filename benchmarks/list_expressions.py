@@ -0,0 +1,58 @@
+"""
+Measures how fast GeneralList.convert_expression_to_general_list builds lists from large list expressions.
+It is compared with building the same list node by node with allocate_node, set_node_next and set_node_down.
+Expressions have three shapes: a flat list, a list of small sublists, and one deeply nested list.
+Usage:
+    python3 -m benchmarks.list_expressions [expression sizes in characters...]
+"""
+import sys
+import time
+from garbage_collection_simulator.data_structures import Memory, GeneralList
+
+
+def make_expressions(size):
+    return {
+        "flat": "(" + "a" * (size - 2) + ")",
+        "sublists": "(" + "(ab)" * ((size - 2) // 4) + ")",
+        "nested": "(" * (size // 2) + ")" * (size // 2),
+    }
+
+
+def build_node_by_node(memory, expression):
+    parents = []
+    previous = None
+    for ch in expression:
+        if ch == ")":
+            previous = parents.pop()
+            continue
+        node = memory.allocate_node(None if ch == "(" else ch)
+        if previous is not None:
+            memory.set_node_next(previous, node)
+        elif parents:
+            memory.set_node_down(parents[-1], node)
+        if ch == "(":
+            parents.append(node)
+            previous = None
+        else:
+            previous = node
+
+
+def time_build(build, expression):
+    memory = Memory(len(expression))
+    start = time.perf_counter()
+    build(memory, expression)
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'shape':>9} {'size (MB)':>10} {'node by node (s)':>17} {'one pass (s)':>13} {'MB/s':>7}")
+    for size in sizes:
+        for shape, expression in make_expressions(size).items():
+            node_by_node = time_build(build_node_by_node, expression)
+            one_pass = time_build(GeneralList.convert_expression_to_general_list, expression)
+            megabytes = len(expression) / 10 ** 6
+            print(f"{shape:>9} {megabytes:>10.1f} {node_by_node:>17.3f} {one_pass:>13.3f} {megabytes / one_pass:>7.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10 ** 6, 4 * 10 ** 6])
@@ -0,0 +1,49 @@
+"""
+Compares marking with pointer reversal and marking in worker processes (Memory(mark_workers=...)).
+The heap holds ROOTS independent lists, each one a chain of sublists, and no garbage.
+Usage:
+    python3 -m benchmarks.parallel_mark [nodes per list] [workers...]
+"""
+import contextlib
+import io
+import sys
+import time
+from garbage_collection_simulator.data_structures import Memory, GeneralList
+
+ROOTS = 16
+
+
+def build_heap(nodes_per_list, mark_workers):
+    memory = Memory(ROOTS * nodes_per_list, mark_workers = mark_workers)
+    lists = []
+    for _ in range(ROOTS):
+        root = memory.allocate_node()
+        previous = None
+        for _ in range(nodes_per_list - 1):
+            node = memory.allocate_node(new_label = "A", new_next = previous)
+            previous = node
+        memory.set_node_down(root, previous)
+        lists.append(GeneralList(memory, root))
+    return memory, lists
+
+
+def time_marking(nodes_per_list, mark_workers):
+    memory, lists = build_heap(nodes_per_list, mark_workers)
+    with memory, contextlib.redirect_stdout(io.StringIO()):
+        if mark_workers is not None:
+            memory.garbage_collect(*lists)  # starts the worker processes
+        start = time.perf_counter()
+        memory.garbage_collect(*lists)
+        return time.perf_counter() - start
+
+
+def main(nodes_per_list, workers):
+    print(f"{ROOTS} lists of {nodes_per_list} nodes")
+    print(f"{'workers':>14} {'collection (s)':>15}")
+    print(f"{'pointer rev.':>14} {time_marking(nodes_per_list, None):>15.3f}")
+    for mark_workers in workers:
+        print(f"{mark_workers:>14} {time_marking(nodes_per_list, mark_workers):>15.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000, [int(arg) for arg in sys.argv[2:]] or [1, 2, 4])
@@ -0,0 +1,46 @@
+"""
+Compares the time spent parsing a script with the time spent executing it.
+The script repeats a few commands of every shape, reassigning a small set of variables so memory stays bounded.
+Usage:
+    python3 -m benchmarks.parser [lines]
+"""
+import contextlib
+import io
+import sys
+import time
+from garbage_collection_simulator.interpreter import Interpreter
+
+COMMANDS = [
+    "a = ((a)(b)c)",
+    "b = (x(y)z)",
+    "Make a Child of b at (* Without Root",
+    "Make (pq) Child of a at (** With Root",
+    "Set Label of b at (** to Q",
+    "Set a at (* Label to R",
+    "Delete b from (*",
+    "c = b",
+]
+
+
+def generate_script(lines):
+    return [COMMANDS[i % len(COMMANDS)] for i in range(lines)]
+
+
+def main(lines):
+    script = generate_script(lines)
+    start = time.perf_counter()
+    for command in script:
+        Interpreter.parse_command(command)
+    parse_time = time.perf_counter() - start
+    interpreter = Interpreter(1000, gc_threshold = 100)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for command in script:
+            interpreter.execute_command(command)
+        execute_time = time.perf_counter() - start
+    print(f"{'lines':>10} {'parse (s)':>10} {'total (s)':>10} {'parse share':>12}")
+    print(f"{lines:>10} {parse_time:>10.3f} {execute_time:>10.3f} {parse_time / execute_time:>12.1%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6)
@@ -0,0 +1,51 @@
+"""
+Compares eager and batched sweep of Memory.garbage_collect.
+With lazy sweep garbage_collect only marks, so its column shows how much of the pause is left to the marking.
+Every node of the heap is allocated and every STRIDE-th node is linked into one live list,
+so garbage is fragmented into runs of STRIDE - 1 nodes.
+Free lists of both modes are compared on heaps up to CHECKED_SIZE nodes.
+Usage:
+    python3 -m benchmarks.sweep [heap sizes...]
+"""
+import contextlib
+import io
+import sys
+import time
+from garbage_collection_simulator.data_structures import Memory, GeneralList
+
+STRIDE = 100
+CHECKED_SIZE = 10 ** 6
+
+
+def build_heap(size, sweep):
+    memory = Memory(size, sweep = sweep)
+    nodes = [memory.allocate_node(new_label = "A") for _ in range(size)]
+    live = nodes[::STRIDE]
+    for node, next_node in zip(live[1:], live[2:]):
+        memory.set_node_next(node, next_node)
+    memory.set_node_down(live[0], live[1])
+    return memory, GeneralList(memory, live[0])
+
+
+def time_garbage_collection(size, sweep):
+    memory, general_list = build_heap(size, sweep)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        memory.garbage_collect(general_list)
+        elapsed = time.perf_counter() - start
+    return elapsed, memory.status() if size <= CHECKED_SIZE else None
+
+
+def main(sizes):
+    print(f"{'nodes':>10} {'eager (s)':>10} {'batched (s)':>12} {'speedup':>8} {'lazy (s)':>9}")
+    for size in sizes:
+        eager, eager_status = time_garbage_collection(size, "eager")
+        batched, batched_status = time_garbage_collection(size, "batched")
+        lazy, _ = time_garbage_collection(size, "lazy")
+        if eager_status != batched_status:
+            raise AssertionError(f"Sweep modes disagree on a heap of {size} nodes.")
+        print(f"{size:>10} {eager:>10.3f} {batched:>12.3f} {eager / batched:>7.1f}x {lazy:>9.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10 ** 5, 10 ** 6, 10 ** 7])
@@ -0,0 +1,260 @@
+"""
+Runs synthetic workloads through Interpreter.execute_command (parsing included), through Interpreter.execute_many with
+operation tuples (the typed API, without command strings) and through Memory and GeneralList directly.
+A workload is generated from its parameters (see WORKLOADS):
+    heap_size: nodes of the memory (it grows twice as large when live lists do not fit).
+    depth and fan_out: nesting depth of generated list expressions and the number of elements of each (sub)list.
+    sharing_ratio: fraction of Make commands which share the list of another variable instead of a new list expression.
+    garbage_ratio: fraction of the heap which is not taken by the lists of variables, so it fills with garbage.
+    mix: relative weights of assignment, Make and Delete commands.
+Every workload and way of running it is measured REPEATS times, each time in a new process, and the fastest run is reported
+with its throughput (commands per second), time spent in collections, pause percentiles and peak resident set size.
+Results can be saved to a baseline file and later runs compared with it; a run which is more than TOLERANCE slower
+(in throughput or collection time) than the baseline is reported as a regression and the exit status is 1.
+Baselines are only comparable on the same machine, and a busy machine needs a larger tolerance.
+Usage:
+    python3 -m benchmarks.workloads [--commands=NUM] [--repeats=NUM] [--tolerance=FRACTION] [--save=/path/to/baseline.json] [--compare=/path/to/baseline.json]
+        [workload names...]
+"""
+import json
+import multiprocessing
+import random
+import resource
+import string
+import sys
+import time
+from garbage_collection_simulator.data_structures import Memory, GeneralList
+from garbage_collection_simulator.events import EventSink
+from garbage_collection_simulator.interpreter import Interpreter
+
+WORKLOADS = {
+    "small-lists": dict(heap_size = 10 ** 4, depth = 2, fan_out = 3, sharing_ratio = 0.2, garbage_ratio = 0.5),
+    "deep-lists": dict(heap_size = 10 ** 5, depth = 8, fan_out = 2, sharing_ratio = 0.2, garbage_ratio = 0.5),
+    "wide-lists": dict(heap_size = 10 ** 5, depth = 1, fan_out = 200, sharing_ratio = 0.2, garbage_ratio = 0.5),
+    "shared-lists": dict(heap_size = 10 ** 4, depth = 3, fan_out = 3, sharing_ratio = 0.9, garbage_ratio = 0.5),
+    "mostly-garbage": dict(heap_size = 10 ** 5, depth = 3, fan_out = 4, sharing_ratio = 0.2, garbage_ratio = 0.95),
+    "mostly-live": dict(heap_size = 10 ** 5, depth = 3, fan_out = 4, sharing_ratio = 0.2, garbage_ratio = 0.2),
+    "make-and-delete": dict(
+        heap_size = 10 ** 4, depth = 2, fan_out = 3, sharing_ratio = 0.5, garbage_ratio = 0.5,
+        mix = {"assign": 1, "make": 4, "delete": 4}
+    ),
+}
+DEFAULT_MIX = {"assign": 4, "make": 3, "delete": 2}
+PATHS = ("interpreter", "api", "memory")
+PERCENTILES = (0.5, 0.9, 0.99)
+REPEATS = 3
+TOLERANCE = 0.2
+SEED = 2020
+
+
+def generate_expression(rng, depth, fan_out):
+    # the first element is a label, so "(*" always finds a node, and the others are sublists while depth allows
+    elements = [rng.choice(string.ascii_letters)]
+    for _ in range(fan_out - 1):
+        if depth > 1:
+            elements.append(generate_expression(rng, depth - 1, fan_out))
+        else:
+            elements.append(rng.choice(string.ascii_letters))
+    return "(" + "".join(elements) + ")"
+
+
+def count_nodes(expression):
+    return len(expression) - expression.count(")")
+
+
+def generate_operations(commands, heap_size, depth, fan_out, sharing_ratio, garbage_ratio, mix = None):
+    """
+    Returns the number of variables and commands operations, after one assignment to each variable:
+        ("assign", variable, list expression)
+        ("make-variable", source variable, target variable, with root)
+        ("make-expression", list expression, target variable, with root)
+        ("delete", variable)
+    Variables are numbers. A variable only shares lists of variables with larger numbers, so lists never form a cycle.
+    """
+    rng = random.Random(SEED)
+    list_size = count_nodes(generate_expression(rng, depth, fan_out))
+    variables = max(2, int((1 - garbage_ratio) * heap_size / list_size))
+    operations = [("assign", variable, generate_expression(rng, depth, fan_out)) for variable in range(variables)]
+    mix = DEFAULT_MIX if mix is None else mix
+    kinds = rng.choices(list(mix), weights = list(mix.values()), k = commands)
+    for kind in kinds:
+        if kind == "assign":
+            operations.append(("assign", rng.randrange(variables), generate_expression(rng, depth, fan_out)))
+        elif kind == "delete":
+            operations.append(("delete", rng.randrange(variables)))
+        elif rng.random() < sharing_ratio:
+            target = rng.randrange(variables - 1)
+            operations.append(("make-variable", rng.randrange(target + 1, variables), target, rng.random() < 0.5))
+        else:
+            operations.append(
+                ("make-expression", generate_expression(rng, depth - 1 or 1, fan_out), rng.randrange(variables), rng.random() < 0.5)
+            )
+    return variables, operations
+
+
+def to_command(operation):
+    kind = operation[0]
+    if kind == "assign":
+        return f"v{operation[1]} = {operation[2]}"
+    if kind == "delete":
+        return f"Delete v{operation[1]} from (*"
+    source = f"v{operation[1]}" if kind == "make-variable" else operation[1]
+    return f"Make {source} Child of v{operation[2]} at (* {'With' if operation[3] else 'Without'} Root"
+
+
+def to_call(operation):
+    # an operation tuple of Interpreter.execute_many
+    kind = operation[0]
+    if kind == "assign":
+        return "assign", f"v{operation[1]}", operation[2]
+    if kind == "delete":
+        return "delete", f"v{operation[1]}", "(*"
+    source = f"v{operation[1]}" if kind == "make-variable" else operation[1]
+    return "make_child", source, f"v{operation[2]}", "(*", operation[3]
+
+
+def gc_threshold(depth, fan_out):
+    # room for the largest command: an assignment
+    return 2 * count_nodes(generate_expression(random.Random(SEED), depth, fan_out))
+
+
+def run_interpreter(heap_size, depth, fan_out, operations):
+    interpreter = Interpreter(
+        heap_size, gc_threshold = gc_threshold(depth, fan_out), growth_factor = 2, events = EventSink("silent")
+    )
+    commands = [to_command(operation) for operation in operations]
+    start = time.perf_counter()
+    for command in commands:
+        interpreter.execute_command(command)
+    return time.perf_counter() - start, interpreter.get_metrics(), interpreter.get_pauses()
+
+
+def run_api(heap_size, depth, fan_out, operations):
+    interpreter = Interpreter(
+        heap_size, gc_threshold = gc_threshold(depth, fan_out), growth_factor = 2, events = EventSink("silent")
+    )
+    calls = [to_call(operation) for operation in operations]
+    start = time.perf_counter()
+    interpreter.execute_many(calls)
+    return time.perf_counter() - start, interpreter.get_metrics(), interpreter.get_pauses()
+
+
+def run_memory(heap_size, depth, fan_out, operations):
+    # the same policy as the interpreter: collect below the threshold and grow when live lists fill the memory
+    memory = Memory(heap_size, events = EventSink("silent"))
+    threshold = gc_threshold(depth, fan_out)
+    lists = {}
+    start = time.perf_counter()
+    for operation in operations:
+        kind = operation[0]
+        if kind == "assign":
+            lists[operation[1]] = GeneralList.convert_expression_to_general_list(memory, operation[2])
+        elif kind == "delete":
+            node, _ = lists[operation[1]].find_node_by_expression("(*")
+            memory.set_node_down(node, None)
+        else:
+            if kind == "make-variable":
+                source = lists[operation[1]]
+            else:
+                source = GeneralList.convert_expression_to_general_list(memory, operation[1])
+            node, _ = lists[operation[2]].find_node_by_expression("(*")
+            memory.set_node_down(node, source.root if operation[3] else memory.get_node_down(source.root))
+        if memory.get_free_node_count() < threshold:
+            memory.garbage_collect(*lists.values())
+            size = memory.get_size()
+            if size - memory.get_free_node_count() > 0.75 * size:
+                memory.grow(2 * size)
+    return time.perf_counter() - start, memory.get_metrics(), memory.get_pauses()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(name, path, commands):
+    # runs in a new process, so the peak resident set size belongs to this run only
+    parameters = dict(WORKLOADS[name])
+    _, operations = generate_operations(commands, **parameters)
+    run = {"interpreter": run_interpreter, "api": run_api, "memory": run_memory}[path]
+    elapsed, metrics, pauses = run(parameters["heap_size"], parameters["depth"], parameters["fan_out"], operations)
+    pauses.sort()
+    collections = metrics["collections"]
+    return {
+        "commands": len(operations),
+        "throughput": len(operations) / elapsed,
+        "gc_time": sum(collection["mark_time"] + collection["sweep_time"] for collection in collections),
+        "collections": len(collections),
+        "pauses_us": {f"p{round(fraction * 100)}": percentile(pauses, fraction) * 1e6 for fraction in PERCENTILES},
+        "max_pause_us": (pauses[-1] if pauses else 0.0) * 1e6,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # kilobytes on Linux
+        "heap_size": metrics["size"],
+    }
+
+
+def measure_in_new_process(name, path, commands):
+    with multiprocessing.Pool(1, maxtasksperchild = 1) as pool:
+        return pool.apply(measure, (name, path, commands))
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        old = baseline[key]
+        throughput_change = result["throughput"] / old["throughput"] - 1
+        gc_time_change = result["gc_time"] / old["gc_time"] - 1 if old["gc_time"] > 0 else 0.0
+        flag = ""
+        if result["throughput"] * (1 + tolerance) < old["throughput"] or gc_time_change > tolerance:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:>28} {throughput_change:>+8.1%} throughput {gc_time_change:>+8.1%} gc time{flag}")
+    return regressions
+
+
+def main(arguments):
+    options = {}
+    names = []
+    for argument in arguments:
+        name, _, value = argument.partition("=")
+        if name in ("--commands", "--repeats", "--tolerance", "--save", "--compare"):
+            options[name] = value
+        else:
+            names.append(argument)
+    for name in names:
+        if name not in WORKLOADS:
+            raise ValueError(f"Expected one of following workloads: {tuple(WORKLOADS)}, got {name}.")
+    commands = int(options.get("--commands", 10 ** 4))
+    repeats = int(options.get("--repeats", REPEATS))
+    tolerance = float(options.get("--tolerance", TOLERANCE))
+    results = {}
+    print(
+        f"{'workload':>16} {'path':>11} {'commands/s':>11} {'gc time (s)':>12} {'p50 (us)':>9} {'p90 (us)':>9} "
+        f"{'p99 (us)':>9} {'max (us)':>9} {'peak RSS (MB)':>14}"
+    )
+    for name in names or WORKLOADS:
+        for path in PATHS:
+            runs = [measure_in_new_process(name, path, commands) for _ in range(repeats)]
+            result = results[f"{name}/{path}"] = max(runs, key = lambda run: run["throughput"])
+            result["gc_time"] = min(run["gc_time"] for run in runs)
+            pauses = result["pauses_us"]
+            print(
+                f"{name:>16} {path:>11} {result['throughput']:>11.0f} {result['gc_time']:>12.3f} {pauses['p50']:>9.0f} "
+                f"{pauses['p90']:>9.0f} {pauses['p99']:>9.0f} {result['max_pause_us']:>9.0f} {result['peak_rss_mb']:>14.1f}"
+            )
+    if "--save" in options:
+        with open(options["--save"], "w") as file:
+            json.dump({"python": sys.version.split()[0], "commands": commands, "results": results}, file, indent = 4)
+    if "--compare" in options:
+        with open(options["--compare"]) as file:
+            baseline = json.load(file)
+        if baseline["commands"] != commands:
+            print(f"Baseline was measured with {baseline['commands']} commands, not {commands}.")
+        if compare(results, baseline["results"], tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,96 @@
+import hashlib
+import marshal
+import os
+from garbage_collection_simulator.interpreter import Interpreter, ParserState
+
+# Bumped whenever the syntax or the instruction format changes, so older cached scripts are not loaded.
+COMPILER_VERSION = 2
+CACHE_DIRECTORY = "__gcscache__"
+# Instructions with this opcode hold the message of a syntax error instead of arguments.
+SYNTAX_ERROR = -1
+
+
+def collect_opcodes(state: ParserState, opcodes: list):
+    for child in state.literals.values():
+        if isinstance(child, ParserState):
+            collect_opcodes(child, opcodes)
+        elif child not in opcodes:
+            opcodes.append(child)
+    return opcodes
+
+
+# Executor tuples of Interpreter.Syntax, numbered in the order they appear in it.
+OPCODES = tuple(collect_opcodes(Interpreter.Grammar, []))
+OPCODE_NUMBERS = {executor: opcode for opcode, executor in enumerate(OPCODES)}
+
+
+def compile_lines(lines, constants: dict = None):
+    """
+    Compiles lines of a script lazily, yielding a (line number, opcode, arguments) instruction for each line.
+    Lines are parsed and validated here, so executing the instructions doesn't parse anything.
+    A line which is not valid becomes a SYNTAX_ERROR instruction, so the error is reported when execution reaches it.
+    Lines may be read from a file, a pipe or any generator, so only the current line is kept in memory.
+    If constants is given, repeated arguments are shared through it (so marshal stores them once).
+    """
+    for line_number, line in enumerate(lines, 1):
+        try:
+            executor, args, needs_memory, needs_variables = Interpreter.parse_command(line)
+        except SyntaxError as err:
+            yield line_number, SYNTAX_ERROR, str(err)
+            continue
+        args = tuple(args)
+        if constants is not None:
+            args = constants.setdefault(args, args)
+        yield line_number, OPCODE_NUMBERS[executor, needs_memory, needs_variables], args
+
+
+def compile_script(lines):
+    """
+    Turns lines of a script into a list of (line number, opcode, arguments) instructions.
+    """
+    return list(compile_lines(lines, {}))
+
+
+def execute_instructions(interpreter: Interpreter, instructions):
+    """
+    Executes compiled instructions one by one and yields (line number, error) for each instruction which fails.
+    """
+    for line_number, opcode, args in instructions:
+        try:
+            if opcode == SYNTAX_ERROR:
+                raise SyntaxError(args)
+            executor, needs_memory, needs_variables = OPCODES[opcode]
+            interpreter.execute_parsed_command(executor, args, needs_memory, needs_variables)
+        except Exception as err:
+            yield line_number, err
+
+
+def get_cache_path(file_path, source: bytes):
+    digest = hashlib.sha256(source)
+    digest.update(str(COMPILER_VERSION).encode())
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIRECTORY, f"{digest.hexdigest()}.bin")
+
+
+def load_script(file_path):
+    """
+    Returns the compiled instructions of a script file.
+    Compiled scripts are cached next to the file in CACHE_DIRECTORY, keyed by the hash of its content,
+    so a script which didn't change is neither parsed nor validated again.
+    """
+    with open(file_path, "rb") as file:
+        source = file.read()
+    cache_path = get_cache_path(file_path, source)
+    try:
+        with open(cache_path, "rb") as cache:
+            return marshal.loads(cache.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    instructions = compile_script(source.decode().splitlines())
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok = True)
+        with open(f"{cache_path}.{os.getpid()}", "wb") as cache:
+            marshal.dump(instructions, cache)
+        os.replace(f"{cache_path}.{os.getpid()}", cache_path)  # other runs never see a half written cache
+    except OSError:
+        pass  # the script is executed anyway, only later runs are slower
+    return instructions
@@ -1,3 +1,12 @@
+from array import array
+import io
+import re
+import time
+from garbage_collection_simulator.events import EventSink
+from garbage_collection_simulator.parallel_marking import ParallelMarker
+from garbage_collection_simulator.verification import verify_heap, HeapCorruptionError
+
+
 class NotEnoughMemoryNodesError(MemoryError):
     pass
 
@@ -7,115 +16,1118 @@ class StackEmptyError(ValueError):
 
 
 class Memory:
-    def __init__(self, size):
+    # Node fields are kept in separate typed columns instead of one list of Python objects.
+    # Integer columns use NULL in place of None. Tags are stored as bytes (see TAGS).
+    # Labels share an integer column with node addresses, because the collector
+    # temporarily stores addresses in labels: addresses are kept as non-negative integers
+    # and single character labels are kept as -(ord(label) + 2).
+    NULL = -1
+    TAGS = (None, False, True)
+    SWEEPS = ("eager", "batched", "lazy")
+    LAZY_SWEEP_CHUNK = 1024
+    # allocate_nodes writes columns with slice assignments from this many bump nodes on
+    BULK_WRITE_SIZE = 64
+    __GARBAGE_RUN = re.compile(b"\x01+")
+    __LIVE_RUN = re.compile(b"\x02+")
+    COLLECTORS = ("mark-sweep", "generational", "incremental", "copying", "reference-counting")
+    OLD_GENERATION = 0
+    YOUNG_GENERATION = 1
+    FREE_GENERATION = 2
+
+    def __init__(self, size, sweep = "batched", collector = "mark-sweep", nursery_size = None,
+                 major_collection_interval = 8, step_budget = 256, pause_target = None, mark_workers = None,
+                 events = None, hash_consing = False, debug = False):
         """
         A memory simulator instance is created with given number of nodes.
-        Each node occupies 4 consequent indices with names: tag, label, next, down.
-        Thus nodes array have 4 * size indices.
+        Each node has 4 fields with names: tag, label, next, down.
+        Node addresses are multiples of 4 (as if each field was a cell) so node i lives at address 4 * i.
+        Each field is stored in its own column: a byte array for tags and integer arrays for the others.
+        Nodes which were never allocated are handed out by a bump pointer and columns only grow as far as it goes,
+        so creating a memory takes constant time. The avail list only holds nodes which were freed.
+        Sweep phase of garbage collection is one of SWEEPS:
+            "eager" frees garbage nodes one by one.
+            "batched" finds runs of garbage nodes in the tag column and links each run into the avail list at once.
+            "lazy" only marks during garbage collection. Allocation sweeps the next LAZY_SWEEP_CHUNK nodes
+            (in batches) whenever the avail list is empty, until the whole memory is swept.
+        Collector is one of COLLECTORS:
+            "mark-sweep" marks and sweeps the whole memory on each collection.
+            "generational" allocates nodes in the young generation. Most collections are minor: they only mark
+            and sweep young nodes and promote the survivors to the old generation. Old nodes which point to young
+            nodes are tracked by a write barrier in a remembered set. Every major_collection_interval-th collection
+            is a major (full) one. In this mode is_nursery_full tells when nursery_size nodes have been allocated
+            since the last collection.
+            "incremental" splits a collection cycle into steps which mark or sweep at most step_budget nodes,
+            or stop earlier when a step has taken pause_target seconds. Marking uses a worklist of gray nodes
+            instead of pointer reversal so the memory is consistent between steps, and a write barrier shades
+            every node which gets stored in next or down while marking. Nodes allocated during the cycle are black.
+            "copying" reserves two semispaces of size nodes. Nodes are allocated with a bump pointer in the
+            current semispace and a collection copies the reachable nodes into the other one (Cheney's algorithm),
+            updating the roots of the given general lists.
+            "reference-counting" keeps the number of next and down pointers to each node plus the number of retain
+            calls (variables bound to the list whose root it is) in a count column. A node is freed as soon as its
+            count drops to zero. Cycles are never freed this way, so a collection is a backup mark-and-sweep which
+            also recounts references from live nodes and roots.
+        With mark_workers, full collections mark reachable nodes in that many worker processes (see ParallelMarker)
+        instead of traversing lists one by one with pointer reversal. Roots are split between the workers.
+        Pause of every collection (or collection step) is recorded, see get_pauses and pause_histogram.
+        Mark and sweep times, live and freed nodes of every collection and allocation counts are recorded too,
+        see get_metrics.
+        Collections report to events (an EventSink, which writes every traversed node to standard output by default).
+        With hash_consing, intern_nodes reuses nodes with the same label, next and down, so identical sublists
+        of list expressions share their nodes. Shared nodes are flagged in a column (see is_shared) and lists copy
+        them before changing them. The table of interned nodes is emptied by every collection.
+        The state of a memory can be exported and imported again (see export_state), e.g. through a snapshot file.
+        With debug, the heap is verified after every collection (see verify) and HeapCorruptionError is raised
+        if it has errors.
+        General lists cache the nodes found by node expressions. Setting next or down of a node forgets the cached
+        paths through it (see watch_node_pointers) and every collection forgets all of them.
+        """
+        if sweep not in Memory.SWEEPS:
+            raise ValueError(f"Expected one of following sweep modes: {Memory.SWEEPS}, got {sweep}.")
+        if collector not in Memory.COLLECTORS:
+            raise ValueError(f"Expected one of following collectors: {Memory.COLLECTORS}, got {collector}.")
+        storage_size = 2 * size if collector == "copying" else size
+        typecode = "i" if 4 * storage_size < 2 ** 31 else "q"
+        self.__tags = bytearray()
+        self.__labels = array(typecode)
+        self.__nexts = array(typecode)
+        self.__downs = array(typecode)
+        self.__size = storage_size
+        self.__sweep = sweep
+        self.__collector = collector
+        # Nodes below the bump pointer are allocated or in the avail list.
+        # Nodes from the bump pointer to the bump limit were never allocated.
+        self.__avail_list_head = None
+        self.__avail_list_length = 0
+        self.__bump = 0
+        self.__bump_limit = size
+        # Nodes from the sweep cursor to the sweep limit are still to be swept (lazy and incremental sweeps).
+        self.__sweep_cursor = 0
+        self.__sweep_limit = 0
+        if collector == "copying":
+            self.__semispace_size = size
+            # set by grow while the upper semispace is in use
+            self.__pending_semispace_size = None
+        elif collector == "reference-counting":
+            self.__counts = array(typecode)
+        # Called with (node, old pointer, new pointer) before next or down of a node is changed.
+        self.__write_barrier = None
+        if collector == "generational":
+            self.__generations = bytearray()
+            self.__young_nodes = []
+            self.__remembered_set = set()
+            self.__nursery_size = nursery_size
+            self.__major_collection_interval = major_collection_interval
+            self.__collections_since_major = 0
+            self.__write_barrier = self.__remember_old_to_young_pointer
+        elif collector == "incremental":
+            self.__phase = "idle"  # or "marking" or "sweeping"
+            self.__gray_nodes = []
+            # metrics of the running cycle
+            self.__cycle_mark_time = self.__cycle_sweep_time = 0.0
+            self.__cycle_live = self.__cycle_free = 0
+            self.__step_budget = step_budget
+            self.__pause_target = pause_target
+            self.__write_barrier = self.__shade_new_pointer
+        elif collector == "reference-counting":
+            self.__write_barrier = self.__count_references
+        self.__parallel_marker = None
+        if mark_workers is not None:
+            self.__parallel_marker = ParallelMarker(mark_workers)
+            self.__share_columns(0, typecode)  # columns are views of shared memory even before the first node
+        self.__pauses = []
+        self.__collections = []
+        self.__allocated = 0
+        self.__allocated_before_collection = 0
+        self.__created = time.perf_counter()
+        self.__events = EventSink() if events is None else events
+        # Nodes made by intern_nodes are flagged until they are freed or allocated again.
+        self.__shared = bytearray() if hash_consing else None
+        self.__interned = {}  # (label, next, down) -> node
+        self.__debug = debug
+        self.__cycle_roots = ()  # lists of the running incremental cycle, verified when it finishes in debug mode
+        # node -> general lists with cached node expressions which pass through the next or down pointer of the node
+        self.__path_watchers = {}
+
+    def __reserve_nodes(self, count):
+        # Columns grow at least twice as large each time to keep allocation amortized O(1).
+        reserved = len(self.__tags)
+        if count <= reserved:
+            return
+        extra = min(max(count, 2 * reserved, 1024), self.__size) - reserved
+        if self.__parallel_marker is not None:
+            # views of shared memory can't be extended, they are replaced by views of larger blocks
+            self.__share_columns(reserved + extra, self.__labels.typecode)
+        else:
+            self.__tags.extend(bytes(extra))
+            self.__nexts.extend(array(self.__nexts.typecode, [Memory.NULL]) * extra)
+            self.__downs.extend(array(self.__downs.typecode, [Memory.NULL]) * extra)
+        self.__labels.extend(array(self.__labels.typecode, [Memory.NULL]) * extra)
+        if self.__collector == "generational":
+            self.__generations.extend(bytes(extra))
+        elif self.__collector == "reference-counting":
+            self.__counts.extend(array(self.__counts.typecode, [0]) * extra)
+        if self.__shared is not None:
+            self.__shared.extend(bytes(extra))
+
+    def __resize(self, storage_size):
+        self.__size = storage_size
+        if self.__labels.typecode == "i" and 4 * storage_size >= 2 ** 31:
+            self.__labels = array("q", self.__labels)
+            if self.__parallel_marker is not None:
+                self.__share_columns(len(self.__labels), "q")
+            else:
+                self.__nexts = array("q", self.__nexts)
+                self.__downs = array("q", self.__downs)
+            if self.__collector == "reference-counting":
+                self.__counts = array("q", self.__counts)
+
+    def __share_columns(self, capacity, typecode):
+        # Tags, nexts and downs live in shared memory blocks of the parallel marker, so its workers mark them in place.
+        self.__tags, self.__nexts, self.__downs = self.__parallel_marker.share_columns(
+            self.__tags, self.__nexts, self.__downs, capacity, typecode
+        )
+
+    def __count_tags(self, tag, start, end):
+        # shared tags are a memoryview, which has no count
+        if self.__parallel_marker is None:
+            return self.__tags.count(tag, start, end)
+        return self.__tags[start:end].tobytes().count(tag)
+
+    def grow(self, new_size):
+        """
+        Makes room for new_size nodes in total. New nodes are handed out by the bump pointer.
+        In copying mode while the upper semispace is in use, both semispaces grow after the next collection.
+        """
+        if new_size <= self.get_size():
+            return
+        if self.__collector != "copying":
+            self.__resize(new_size)
+            self.__bump_limit = new_size
+        elif self.__bump_limit == self.__semispace_size:
+            self.__resize(2 * new_size)
+            self.__semispace_size = self.__bump_limit = new_size
+        else:
+            self.__pending_semispace_size = new_size
+
+    def get_size(self):
+        """
+        Returns the number of nodes which could be allocated (one semispace in copying mode).
         """
-        self.__nodes = [None] * (size * 4)
-        self.__size = size
-        self.__avail_list_head = 0
-        self.__init_avail_list()
+        return self.__semispace_size if self.__collector == "copying" else self.__size
 
-    def __init_avail_list(self):
-        for i in range(self.__size - 1):
-            self.set_node_next(i * 4, i * 4 + 4)
+    def close(self):
+        """
+        Stops the worker processes of parallel marking and frees its shared memory. The columns are copied back,
+        so the memory can still be used and marks with pointer reversal from now on.
+        """
+        if self.__parallel_marker is None:
+            return
+        typecode = self.__labels.typecode
+        self.__tags = bytearray(self.__tags)
+        self.__nexts = Memory.__load_column(typecode, self.__nexts.cast("B"))
+        self.__downs = Memory.__load_column(typecode, self.__downs.cast("B"))
+        self.__parallel_marker.shutdown()
+        self.__parallel_marker = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def export_state(self, *lists_roots):
+        """
+        Returns fields (a dictionary of numbers and names) and columns (a dictionary of memoryviews) which import_state
+        turns back into this memory. Columns are views of the memory, so they should be used and released before it changes
+        (columns can't grow while they are viewed).
+        A running incremental collection cycle is finished first.
+        Retain calls for lists_roots are not counted in the state, because their lists are retained again when
+        they are bound to variables after import.
+        """
+        if self.is_collecting():
+            self.__finish_collection_cycle()
+        nodes = self.__bump
+        fields = {
+            "collector": self.__collector,
+            "typecode": self.__labels.typecode,
+            "nodes": nodes,
+            "size": self.__size,
+            "bump_limit": self.__bump_limit,
+            "avail_list_head": self.__avail_list_head,
+            "avail_list_length": self.__avail_list_length,
+            "sweep_cursor": self.__sweep_cursor,
+            "sweep_limit": self.__sweep_limit,
+        }
+        columns = {
+            "tags": memoryview(self.__tags)[:nodes],
+            "labels": memoryview(self.__labels)[:nodes],
+            "nexts": memoryview(self.__nexts)[:nodes],
+            "downs": memoryview(self.__downs)[:nodes],
+        }
+        if self.__collector == "copying":
+            fields["semispace_size"] = self.__semispace_size
+            fields["pending_semispace_size"] = self.__pending_semispace_size
+        elif self.__collector == "generational":
+            fields["collections_since_major"] = self.__collections_since_major
+            columns["generations"] = memoryview(self.__generations)[:nodes]
+            columns["young_nodes"] = memoryview(array(self.__labels.typecode, self.__young_nodes))
+            columns["remembered_set"] = memoryview(array(self.__labels.typecode, self.__remembered_set))
+        elif self.__collector == "reference-counting":
+            counts = self.__counts[:nodes]
+            for list_root in lists_roots:
+                counts[list_root.root >> 2] -= 1
+            columns["counts"] = memoryview(counts)
+        if self.__shared is not None:
+            columns["shared"] = memoryview(self.__shared)[:nodes]
+        return fields, columns
+
+    def import_state(self, fields, columns):
+        """
+        Replaces every node of this memory with the nodes of a state returned by export_state (of a memory with
+        the same collector). Columns are copied, so they may be views of a mapped file which is closed afterwards.
+        The memory keeps its size unless the state needs more nodes.
+        """
+        if fields["collector"] != self.__collector:
+            raise ValueError(f"Expected a state of a {self.__collector} memory, got {fields['collector']}.")
+        if "shared" in columns and self.__shared is None:
+            # lists would change shared nodes in place
+            raise ValueError("Expected a memory with hash consing for a state with shared nodes.")
+        size = self.get_size()
+        self.__forget_all_paths()
+        typecode = fields["typecode"]
+        self.__tags = bytearray(columns["tags"])
+        self.__labels = Memory.__load_column(typecode, columns["labels"])
+        self.__nexts = Memory.__load_column(typecode, columns["nexts"])
+        self.__downs = Memory.__load_column(typecode, columns["downs"])
+        if self.__parallel_marker is not None:
+            self.__share_columns(len(self.__tags), typecode)
+        self.__size = fields["size"]
+        self.__bump = fields["nodes"]
+        self.__bump_limit = fields["bump_limit"]
+        self.__avail_list_head = fields["avail_list_head"]
+        self.__avail_list_length = fields["avail_list_length"]
+        self.__sweep_cursor = fields["sweep_cursor"]
+        self.__sweep_limit = fields["sweep_limit"]
+        if self.__collector == "copying":
+            self.__semispace_size = fields["semispace_size"]
+            self.__pending_semispace_size = fields["pending_semispace_size"]
+        elif self.__collector == "generational":
+            self.__collections_since_major = fields["collections_since_major"]
+            self.__generations = bytearray(columns["generations"])
+            self.__young_nodes = Memory.__load_column(typecode, columns["young_nodes"]).tolist()
+            self.__remembered_set = set(Memory.__load_column(typecode, columns["remembered_set"]))
+        elif self.__collector == "incremental":
+            self.__phase = "idle"
+            self.__gray_nodes = []
+        elif self.__collector == "reference-counting":
+            self.__counts = Memory.__load_column(typecode, columns["counts"])
+        if self.__shared is not None:
+            self.__shared = bytearray(columns["shared"]) if "shared" in columns else bytearray(len(self.__tags))
+        self.__interned.clear()
+        if self.__sweep != "lazy" and self.__sweep_cursor < self.__sweep_limit:
+            self.__sweep_range(self.__sweep_cursor, self.__sweep_limit)
+            self.__sweep_cursor = self.__sweep_limit
+        self.__resize(self.__size)  # wider columns may be needed on this machine
+        self.grow(size)
+
+    @staticmethod
+    def __load_column(typecode, buffer):
+        # one copy of the raw bytes, without going through Python integers
+        column = array(typecode)
+        column.frombytes(buffer)
+        return column
+
+    def get_free_node_count(self):
+        free_nodes = self.__avail_list_length + self.__bump_limit - self.__bump
+        if self.__sweep_cursor < self.__sweep_limit:
+            # garbage which is not swept yet
+            free_nodes += self.__count_tags(1, self.__sweep_cursor, self.__sweep_limit)
+        return free_nodes
+
+    @staticmethod
+    def __encode_label(label):
+        if label is None:
+            return Memory.NULL
+        if isinstance(label, int):
+            if label < 0:
+                raise ValueError(f"Negative integers can not be stored as labels, got {label}.")
+            return label
+        if isinstance(label, str) and len(label) == 1:
+            return -ord(label) - 2
+        raise ValueError(f"Labels should be single characters or node addresses, got {label!r}.")
+
+    @staticmethod
+    def __decode_label(value):
+        if value >= 0:
+            return value
+        if value == Memory.NULL:
+            return None
+        return chr(-value - 2)
 
     def allocate_node(self, new_label = None, new_down = None, new_next = None):
-        if self.__avail_list_head is None:
-            raise NotEnoughMemoryNodesError("Can not allocate nodes due to insufficient memory space.")
-        next_avail_node = self.get_node_next(self.__avail_list_head)
         allocated_node = self.__avail_list_head
-        self.__avail_list_head = next_avail_node
-        self.set_node_next(allocated_node, new_next)
-        self.set_node_down(allocated_node, new_down)
-        self.set_node_label(allocated_node, new_label)
+        if allocated_node is None:
+            if self.__collector == "incremental" and self.__phase != "idle":  # is_collecting, inlined
+                # Garbage of the running cycle is needed right now, so the cycle is finished without a pause bound.
+                start = time.perf_counter()
+                self.__finish_collection_cycle()
+                self.__pauses.append(time.perf_counter() - start)
+                allocated_node = self.__avail_list_head
+            elif self.__sweep_cursor < self.__sweep_limit:
+                start = time.perf_counter()
+                self.__sweep_lazily()
+                self.__pauses.append(time.perf_counter() - start)
+                allocated_node = self.__avail_list_head
+        if allocated_node is not None:
+            i = allocated_node >> 2
+            next_avail_node = self.__nexts[i]
+            self.__avail_list_head = None if next_avail_node == Memory.NULL else next_avail_node
+            self.__avail_list_length -= 1
+        elif self.__bump < self.__bump_limit:
+            i = self.__bump
+            if i == len(self.__tags):
+                self.__reserve_nodes(i + 1)
+            self.__bump = i + 1
+            allocated_node = 4 * i
+        else:
+            raise NotEnoughMemoryNodesError("Can not allocate nodes due to insufficient memory space.")
+        self.__allocated += 1
+        # Encoding of the usual labels (none or a character) is inlined, this is the hottest path of the memory.
+        if new_label is None:
+            self.__labels[i] = Memory.NULL
+        elif type(new_label) is str and len(new_label) == 1:
+            self.__labels[i] = -ord(new_label) - 2
+        else:
+            self.__labels[i] = Memory.__encode_label(new_label)
+        self.__nexts[i] = Memory.NULL if new_next is None else new_next
+        self.__downs[i] = Memory.NULL if new_down is None else new_down
+        if self.__write_barrier is None and self.__shared is None:
+            # mark-and-sweep and copying memories keep nothing else per node
+            return allocated_node
+        if self.__shared is not None:
+            self.__shared[i] = 0
+        if self.__collector == "generational":
+            self.__generations[i] = Memory.YOUNG_GENERATION
+            self.__young_nodes.append(allocated_node)
+        elif self.__collector == "incremental" and self.__phase == "marking":
+            self.__tags[i] = 2
+        elif self.__collector == "reference-counting":
+            self.__counts[i] = 0
+        if self.__write_barrier is not None and (new_next is not None or new_down is not None):
+            self.__write_barrier(allocated_node, None, new_next)
+            self.__write_barrier(allocated_node, None, new_down)
         return allocated_node
 
+    def allocate_nodes(self, labels, nexts, downs):
+        """
+        Allocates len(labels) nodes at once and returns their addresses.
+        Next and down of the k-th node are given as positions of other new nodes in nexts[k] and downs[k]
+        (-1 for None), so new nodes only point to each other and no write barrier is needed.
+        Either all nodes are allocated or NotEnoughMemoryNodesError is raised before any of them.
+        Nodes are the ones count allocate_node calls would take: from the avail list (sweeping lazily when it runs out),
+        then as one contiguous run from the bump pointer.
+        """
+        count = len(labels)
+        self.__ensure_free_nodes(count)
+        nodes = []
+        while True:
+            node = self.__avail_list_head
+            while node is not None and len(nodes) < count:
+                nodes.append(node)
+                next_avail_node = self.__nexts[node >> 2]
+                node = None if next_avail_node == Memory.NULL else next_avail_node
+            self.__avail_list_head = node
+            if len(nodes) == count:
+                break
+            if self.__sweep_cursor >= self.__sweep_limit:
+                break
+            start = time.perf_counter()
+            self.__sweep_lazily()
+            self.__pauses.append(time.perf_counter() - start)
+        self.__avail_list_length -= len(nodes)
+        self.__allocated += count
+        reused = len(nodes)
+        bump = self.__bump
+        if reused < count:
+            self.__reserve_nodes(bump + count - reused)
+            self.__bump = bump + count - reused
+            nodes.extend(range(4 * bump, 4 * self.__bump, 4))
+        # Small runs are written node by node, large runs of bump nodes with one slice assignment per column.
+        written = count if count - reused < Memory.BULK_WRITE_SIZE else reused
+        null = Memory.NULL
+        encode_label = Memory.__encode_label
+        column_labels, column_nexts, column_downs = self.__labels, self.__nexts, self.__downs
+        for k in range(written):
+            i = nodes[k] >> 2
+            column_labels[i] = null if labels[k] is None else encode_label(labels[k])
+            column_nexts[i] = null if nexts[k] == -1 else nodes[nexts[k]]
+            column_downs[i] = null if downs[k] == -1 else nodes[downs[k]]
+        if written < count:
+            codes = {label: encode_label(label) for label in set(labels)}
+            typecode = column_labels.typecode
+            column_labels[bump:self.__bump] = array(typecode, [codes[label] for label in labels[reused:]])
+            column_nexts[bump:self.__bump] = array(
+                typecode, [null if position == -1 else nodes[position] for position in nexts[reused:]]
+            )
+            column_downs[bump:self.__bump] = array(
+                typecode, [null if position == -1 else nodes[position] for position in downs[reused:]]
+            )
+        if self.__shared is not None:
+            for node in nodes:
+                self.__shared[node >> 2] = 0
+        if self.__collector == "generational":
+            for node in nodes:
+                self.__generations[node >> 2] = Memory.YOUNG_GENERATION
+            self.__young_nodes.extend(nodes)
+        elif self.__collector == "incremental" and self.__phase == "marking":
+            for node in nodes:
+                self.__tags[node >> 2] = 2
+        elif self.__collector == "reference-counting":
+            for node in nodes:
+                self.__counts[node >> 2] = 0
+            for position in nexts:
+                if position != -1:
+                    self.__counts[nodes[position] >> 2] += 1
+            for position in downs:
+                if position != -1:
+                    self.__counts[nodes[position] >> 2] += 1
+        return nodes
+
+    def __ensure_free_nodes(self, count):
+        if self.is_collecting() and self.__avail_list_length < count:
+            # Garbage of the running cycle is needed (or nodes could run out while they are taken), so it is finished.
+            start = time.perf_counter()
+            self.__finish_collection_cycle()
+            self.__pauses.append(time.perf_counter() - start)
+        if self.__avail_list_length + self.__bump_limit - self.__bump < count and self.get_free_node_count() < count:
+            raise NotEnoughMemoryNodesError("Can not allocate nodes due to insufficient memory space.")
+
+    def intern_nodes(self, labels, nexts, downs):
+        """
+        Returns nodes for a batch given like in allocate_nodes, where nodes which were made by earlier intern_nodes
+        calls (since the last collection) with the same label, next and down are reused instead of allocated.
+        Nodes are looked up from the last one, which is the deepest or the last of its sublist, so identical
+        sublists share every node. The first node (the root of a list) is always a new node which is not shared.
+        New nodes are allocated one by one, so some of them are garbage if memory runs out in between.
+        """
+        shared, table = self.__shared, self.__interned
+        nodes = [None] * len(labels)
+        for position in range(len(labels) - 1, -1, -1):
+            label = labels[position]
+            next_node = None if nexts[position] == -1 else nodes[nexts[position]]
+            down_node = None if downs[position] == -1 else nodes[downs[position]]
+            if position == 0:
+                nodes[0] = self.allocate_node(label, down_node, next_node)
+                break
+            key = (label, next_node, down_node)
+            node = table.get(key)
+            if node is None or not self.__holds_key(node, key):
+                node = table[key] = self.allocate_node(label, down_node, next_node)
+                shared[node >> 2] = 1
+            nodes[position] = node
+        return nodes
+
+    def __holds_key(self, node, key):
+        # Reference counting may free an interned node, which may then be allocated again for another key.
+        label, next_node, down_node = key
+        return (
+            self.__shared[node >> 2] == 1
+            and self.get_node_label(node) == label
+            and self.get_node_next(node) == next_node
+            and self.get_node_down(node) == down_node
+        )
+
+    def is_hash_consing(self):
+        return self.__shared is not None
+
+    def is_shared(self, node):
+        """
+        Tells whether node was made by intern_nodes, so it may be part of several lists and should not be changed.
+        """
+        return self.__shared is not None and self.__shared[node >> 2] == 1
+
     def free_node(self, node):
-        self.set_node_next(node, self.__avail_list_head)
+        self.__write_next(node, self.__avail_list_head)
         self.__avail_list_head = node
+        self.__avail_list_length += 1
+        if self.__shared is not None:
+            self.__shared[node >> 2] = 0
+        if self.__collector == "generational":
+            self.__generations[node >> 2] = Memory.FREE_GENERATION
+
+    def watch_node_pointers(self, node, general_list):
+        """
+        general_list.forget_paths_through(node) is called when next or down of node changes.
+        """
+        watchers = self.__path_watchers.get(node)
+        if watchers is None:
+            self.__path_watchers[node] = {general_list}
+        else:
+            watchers.add(general_list)
+
+    def unwatch_node_pointers(self, nodes, general_list):
+        """
+        Stops calling general_list.forget_paths_through for nodes, so the memory doesn't keep the list alive.
+        """
+        for node in nodes:
+            watchers = self.__path_watchers.get(node)
+            if watchers is not None:
+                watchers.discard(general_list)
+                if not watchers:
+                    del self.__path_watchers[node]
+
+    def __forget_paths_through(self, node):
+        for general_list in self.__path_watchers.pop(node):
+            general_list.forget_paths_through(node)
+
+    def __forget_all_paths(self):
+        for watchers in self.__path_watchers.values():
+            for general_list in watchers:
+                general_list.forget_paths()
+        self.__path_watchers.clear()
 
     def set_node_next(self, node, new_next):
-        self.__nodes[node + 2] = new_next
+        if node in self.__path_watchers:
+            self.__forget_paths_through(node)
+        if self.__write_barrier is not None:
+            self.__write_barrier(node, self.get_node_next(node), new_next)
+        self.__write_next(node, new_next)
 
     def set_node_down(self, node, new_down):
-        self.__nodes[node + 3] = new_down
+        if node in self.__path_watchers:
+            self.__forget_paths_through(node)
+        if self.__write_barrier is not None:
+            self.__write_barrier(node, self.get_node_down(node), new_down)
+        self.__write_down(node, new_down)
+        if new_down is None and self.__labels[node >> 2] >= 0:
+            # pointer reversal leaves addresses in labels of nodes with children, which a node without them shows
+            self.__labels[node >> 2] = Memory.NULL
+
+    def __write_next(self, node, new_next):
+        self.__nexts[node >> 2] = Memory.NULL if new_next is None else new_next
+
+    def __write_down(self, node, new_down):
+        self.__downs[node >> 2] = Memory.NULL if new_down is None else new_down
+
+    def __remember_old_to_young_pointer(self, node, old_pointer, new_pointer):
+        if (
+            new_pointer is not None
+            and self.__generations[new_pointer >> 2] == Memory.YOUNG_GENERATION
+            and self.__generations[node >> 2] == Memory.OLD_GENERATION
+        ):
+            self.__remembered_set.add(node)
+
+    def __shade_new_pointer(self, node, old_pointer, new_pointer):
+        if self.__phase == "marking":
+            self.__shade(new_pointer)
+
+    def __shade(self, node):
+        # Marked nodes are gray while they are in the worklist and black afterwards.
+        if node is not None and self.__tags[node >> 2] != 2:
+            self.__tags[node >> 2] = 2
+            self.__gray_nodes.append(node)
+
+    def __count_references(self, node, old_pointer, new_pointer):
+        if new_pointer is not None:
+            self.__counts[new_pointer >> 2] += 1
+        if old_pointer is not None:
+            self.release(old_pointer)
+
+    def retain(self, node):
+        """
+        Counts a reference to node from outside of memory, e.g. a variable. Only used in reference counting mode.
+        """
+        if self.__collector == "reference-counting":
+            self.__counts[node >> 2] += 1
+
+    def release(self, node):
+        """
+        Drops a reference to node in reference counting mode. The node and then its children are freed when
+        they have no references left. Releasing a node which was never referenced frees it too.
+        """
+        if self.__collector != "reference-counting":
+            return
+        counts = self.__counts
+        if counts[node >> 2] > 1:
+            counts[node >> 2] -= 1
+            return
+        counts[node >> 2] = 0
+        garbage_nodes = [node]
+        while garbage_nodes:
+            node = garbage_nodes.pop()
+            children = self.__nexts[node >> 2], self.__downs[node >> 2]
+            self.free_node(node)
+            for child in children:
+                if child != Memory.NULL and counts[child >> 2] > 0:
+                    counts[child >> 2] -= 1
+                    if counts[child >> 2] == 0:
+                        garbage_nodes.append(child)
+
+    def is_nursery_full(self):
+        if self.__collector != "generational" or self.__nursery_size is None:
+            return False
+        return len(self.__young_nodes) >= self.__nursery_size
 
     def set_node_label(self, node, new_label):
-        self.__nodes[node + 1] = new_label
+        self.__labels[node >> 2] = Memory.__encode_label(new_label)
 
     def get_node_label(self, node):
-        return self.__nodes[node + 1]
+        return Memory.__decode_label(self.__labels[node >> 2])
 
     def get_node_down(self, node):
-        return self.__nodes[node + 3]
+        down = self.__downs[node >> 2]
+        return None if down == Memory.NULL else down
 
     def get_node_next(self, node):
-        return self.__nodes[node + 2]
+        next_node = self.__nexts[node >> 2]
+        return None if next_node == Memory.NULL else next_node
 
     def __get_node_tag(self, node):
-        return self.__nodes[node]
+        return Memory.TAGS[self.__tags[node >> 2]]
 
     def __set_node_tag(self, node, new_tag):
-        self.__nodes[node] = new_tag
+        self.__tags[node >> 2] = 0 if new_tag is None else 1 + bool(new_tag)
+
+    def __node_fields(self, i):
+        node = 4 * i
+        if i >= len(self.__tags):
+            fields = (None, None, None, None)
+        else:
+            fields = (self.__get_node_tag(node), self.get_node_label(node), self.get_node_next(node), self.get_node_down(node))
+        if self.__bump <= i < self.__bump_limit:
+            # never allocated nodes are shown as a chain after the bump pointer
+            fields = fields[:2] + (node + 4 if i + 1 < self.__bump_limit else None,) + fields[3:]
+        return fields
 
     def status(self):
-        return [
-            (
-                self.__nodes[4 * i],  # tag
-                self.__nodes[4 * i + 1],  # label
-                self.__nodes[4 * i + 2],  # next
-                self.__nodes[4 * i + 3]  # down
-            ) for i in range(self.__size)
-        ]
+        # (tag, label, next, down) for each node
+        return [self.__node_fields(i) for i in range(self.__size)]
 
     def __str__(self):
         return "\n".join(
             [
                 f"node #{i + 1} : "
-                f"(tag = {self.__nodes[4 * i]}, "
-                f"label = {self.__nodes[4 * i + 1]}, "
-                f"next = {self.__nodes[4 * i + 2]}, "
-                f"down = {self.__nodes[4 * i + 3]})" for i in range(self.__size)
+                f"(tag = {tag}, "
+                f"label = {label}, "
+                f"next = {next_node}, "
+                f"down = {down})" for i, (tag, label, next_node, down) in enumerate(self.status())
             ]
         )
 
-    def garbage_collect(self, *lists_roots):
-        print("Starting Garbage Collection")
+    def garbage_collect(self, *lists_roots, major = False):
+        """
+        Frees nodes which are not reachable from given general lists.
+        In generational mode this is a minor collection unless major is set
+        or major_collection_interval collections have passed since the last major one.
+        In incremental mode this starts a collection cycle if none is running and does one step of it.
+        In copying mode reachable nodes move to the other semispace and roots of given lists are updated.
+        """
+        self.__forget_all_paths()  # nodes on cached paths may move or be freed
+        # Interned nodes may be garbage (swept later) or move, so they are not reused after a collection.
+        # They stay flagged as shared, since lists may still share them.
+        self.__interned.clear()
+        if self.__collector == "incremental":
+            if not self.is_collecting():
+                self.__start_collection_cycle(lists_roots)
+            self.collect_step()
+            self.__events.flush()
+            return
+        start = time.perf_counter()
+        if self.__collector == "copying":
+            self.__collect_by_copying(lists_roots)
+        elif self.__collector == "generational":
+            self.__collections_since_major += 1
+            if not major and self.__collections_since_major < self.__major_collection_interval:
+                self.__collect_young_generation(lists_roots)
+            else:
+                self.__collections_since_major = 0
+                self.__collect_all(lists_roots)
+        else:
+            self.__collect_all(lists_roots)
+        self.__pauses.append(time.perf_counter() - start)
+        if self.__debug:
+            self.__verify_after_collection(lists_roots)
+        self.__events.flush()
+
+    def verify(self, *lists_roots):
+        """
+        Checks the heap from the roots of lists_roots without changing it and returns a report
+        (see verification.verify_heap): dangling pointers, reachable free nodes, labels left holding addresses by
+        pointer reversal, live nodes of each list, shared nodes and cycles.
+        """
+        fields, columns = self.export_state(*lists_roots)
+        try:
+            return verify_heap(fields, columns, [list_root.root for list_root in lists_roots])
+        finally:
+            for column in columns.values():
+                column.release()
+
+    def __verify_after_collection(self, lists_roots):
+        report = self.verify(*lists_roots)
+        self.__events.emit(
+            "summary", "heap-verified",
+            f"Heap verified: {report['live']} live, {report['garbage']} garbage, {report['free']} free nodes\n",
+            **report
+        )
+        if report["error_count"]:
+            self.__events.flush()
+            raise HeapCorruptionError(f"Heap has {report['error_count']} errors: {'; '.join(report['errors'])}.")
+
+    def __collect_all(self, lists_roots):
+        self.__events.emit("summary", "collection-started", "Starting Garbage Collection\n", collector = self.__collector)
+        start = time.perf_counter()
+        free_nodes = self.get_free_node_count() - (self.__bump_limit - self.__bump)
         # mark all as garbage
-        for i in range(self.__size):
-            self.__set_node_tag(i * 4, False)
+        if self.__sweep == "eager":
+            for i in range(self.__bump):
+                self.__set_node_tag(i * 4, False)
+        else:
+            self.__tags[:self.__bump] = b"\x01" * self.__bump
         # mark accessible nodes
-        for list_root in lists_roots:
-            self.__traverse_list_and_mark_tags(list_root)
+        if self.__parallel_marker is not None:
+            roots = {list_root.root for list_root in lists_roots}
+            self.__parallel_marker.mark(self.__bump, roots)
+        elif self.__collector == "reference-counting":
+            # pointer reversal does not stop at marked nodes, so it would never finish on a cycle
+            self.__mark_reachable_nodes([list_root.root for list_root in lists_roots])
+        else:
+            for list_root in lists_roots:
+                self.__traverse_list_and_mark_tags(list_root)
+        live = self.__count_tags(2, 0, self.__bump)
+        marked = time.perf_counter()
         # sweep garbage nodes
-        for i in range(self.__size):
-            if not self.__get_node_tag(i * 4):
-                self.free_node(i * 4)
-        print("Finished Garbage Collection")
+        # Free nodes are not marked either, so the avail list is rebuilt from scratch.
+        self.__avail_list_head = None
+        self.__avail_list_length = 0
+        if self.__sweep == "eager":
+            for i in range(self.__bump):
+                if not self.__get_node_tag(i * 4):
+                    self.free_node(i * 4)
+        elif self.__sweep == "lazy":
+            self.__sweep_cursor = 0
+            self.__sweep_limit = self.__bump
+        else:
+            self.__sweep_range(0, self.__bump)
+        if self.__collector == "generational":
+            # every survivor is old now
+            self.__generations[:] = bytes(len(self.__generations))
+            self.__young_nodes.clear()
+            self.__remembered_set.clear()
+        elif self.__collector == "reference-counting":
+            self.__recount_references(lists_roots)
+        # Nodes which were already free are not counted as freed again.
+        self.__record_collection("full", marked - start, time.perf_counter() - marked, live, self.__bump - live - free_nodes)
+        self.__events.emit(
+            "summary", "collection-finished", "Finished Garbage Collection\n",
+            collector = self.__collector, avail_list_length = self.__avail_list_length
+        )
+
+    def __mark_reachable_nodes(self, nodes):
+        tags, nexts, downs = self.__tags, self.__nexts, self.__downs
+        gray_nodes = list(nodes)
+        while gray_nodes:
+            node = gray_nodes.pop()
+            if node == Memory.NULL or tags[node >> 2] == 2:
+                continue
+            tags[node >> 2] = 2
+            gray_nodes.append(nexts[node >> 2])
+            gray_nodes.append(downs[node >> 2])
+
+    def __recount_references(self, lists_roots):
+        counts, nexts, downs = self.__counts, self.__nexts, self.__downs
+        counts[:self.__bump] = array(counts.typecode, [0]) * self.__bump
+        for run in Memory.__LIVE_RUN.finditer(self.__tags, 0, self.__bump):
+            for i in range(*run.span()):
+                if nexts[i] != Memory.NULL:
+                    counts[nexts[i] >> 2] += 1
+                if downs[i] != Memory.NULL:
+                    counts[downs[i] >> 2] += 1
+        for list_root in lists_roots:
+            counts[list_root.root >> 2] += 1
+
+    def __collect_by_copying(self, lists_roots):
+        self.__events.emit("summary", "collection-started", "Starting Garbage Collection\n", collector = self.__collector)
+        start = time.perf_counter()
+        from_space = self.__bump_limit - self.__semispace_size
+        to_space = self.__semispace_size - from_space
+        used = self.__bump - from_space
+        self.__reserve_nodes(to_space + self.__semispace_size)
+        tags, labels, nexts, downs, shared = self.__tags, self.__labels, self.__nexts, self.__downs, self.__shared
+        # A copied node is marked in from-space and its next holds the forwarding address.
+        tags[from_space:self.__bump] = b"\x01" * (self.__bump - from_space)
+        free = to_space
+
+        def copy(node):
+            nonlocal free
+            if node == Memory.NULL or not from_space <= node >> 2 < self.__bump:
+                return node
+            i = node >> 2
+            if tags[i] == 2:
+                return nexts[i]
+            tags[free] = 1
+            labels[free] = labels[i]
+            nexts[free] = nexts[i]
+            downs[free] = downs[i]
+            if shared is not None:
+                shared[free] = shared[i]
+            tags[i] = 2
+            nexts[i] = 4 * free
+            free += 1
+            return 4 * (free - 1)
+
+        for list_root in lists_roots:
+            list_root.root = copy(list_root.root)
+        scan = to_space
+        while scan < free:
+            nexts[scan] = copy(nexts[scan])
+            downs[scan] = copy(downs[scan])
+            scan += 1
+        self.__bump = free
+        self.__bump_limit = to_space + self.__semispace_size
+        self.__avail_list_head = None
+        self.__avail_list_length = 0
+        if self.__pending_semispace_size is not None and to_space == 0:
+            # the old semispace above the lower one is garbage now, so the lower one can grow into it
+            self.__resize(2 * self.__pending_semispace_size)
+            self.__semispace_size = self.__bump_limit = self.__pending_semispace_size
+            self.__pending_semispace_size = None
+        # copying marks and sweeps at once, so the whole collection counts as marking
+        self.__record_collection("copying", time.perf_counter() - start, 0.0, free - to_space, used - (free - to_space))
+        self.__events.emit(
+            "summary", "collection-finished", f"Finished Garbage Collection ({free - to_space} nodes copied)\n",
+            collector = self.__collector, copied = free - to_space
+        )
+
+    def is_collecting(self):
+        return self.__collector == "incremental" and self.__phase != "idle"
+
+    def __start_collection_cycle(self, lists_roots):
+        self.__events.emit(
+            "summary", "collection-started", "Starting Incremental Garbage Collection\n", collector = self.__collector
+        )
+        self.__tags[:self.__bump] = b"\x01" * self.__bump
+        self.__phase = "marking"
+        for list_root in lists_roots:
+            self.__shade(list_root.root)
+        if self.__debug:
+            self.__cycle_roots = lists_roots
+
+    def collect_step(self):
+        """
+        Does one bounded step of the running incremental collection cycle.
+        Returns True if the cycle is not finished yet.
+        """
+        if not self.is_collecting():
+            return False
+        start = time.perf_counter()
+        work = self.__step_budget
+        while work > 0 and self.__phase != "idle":
+            # the clock is checked every 32 nodes
+            chunk = min(work, 32)
+            self.__collect_chunk(chunk)
+            work -= chunk
+            if self.__pause_target is not None and time.perf_counter() - start >= self.__pause_target:
+                break
+        self.__pauses.append(time.perf_counter() - start)
+        return self.__phase != "idle"
+
+    def __finish_collection_cycle(self):
+        while self.__phase != "idle":
+            self.__collect_chunk(self.__size)
+
+    def __collect_chunk(self, count):
+        start = time.perf_counter()
+        if self.__phase == "marking":
+            self.__mark_gray_nodes(count)
+            self.__cycle_mark_time += time.perf_counter() - start
+            return
+        self.__sweep_nodes(count)
+        self.__cycle_sweep_time += time.perf_counter() - start
+        if self.__phase == "idle":
+            self.__record_collection(
+                "incremental", self.__cycle_mark_time, self.__cycle_sweep_time,
+                self.__cycle_live, self.__sweep_limit - self.__cycle_live - self.__cycle_free
+            )
+            self.__cycle_mark_time = self.__cycle_sweep_time = 0.0
+            if self.__debug:
+                lists_roots, self.__cycle_roots = self.__cycle_roots, ()
+                self.__verify_after_collection(lists_roots)
+
+    def __mark_gray_nodes(self, count):
+        gray_nodes = self.__gray_nodes
+        while count > 0 and gray_nodes:
+            node = gray_nodes.pop()
+            self.__shade(self.get_node_next(node))
+            self.__shade(self.get_node_down(node))
+            count -= 1
+        if not gray_nodes:
+            # Nodes left in the old avail list are not marked, so the sweep builds a new one.
+            self.__phase = "sweeping"
+            self.__cycle_live = self.__count_tags(2, 0, self.__bump)
+            self.__cycle_free = self.__avail_list_length
+            self.__avail_list_head = None
+            self.__avail_list_length = 0
+            self.__sweep_cursor = 0
+            # nodes allocated by the bump pointer from now on are not swept
+            self.__sweep_limit = self.__bump
+
+    def __sweep_nodes(self, count):
+        end = min(self.__sweep_cursor + count, self.__sweep_limit)
+        self.__sweep_range(self.__sweep_cursor, end)
+        self.__sweep_cursor = end
+        if end == self.__sweep_limit:
+            self.__phase = "idle"
+            self.__events.emit(
+                "summary", "collection-finished", "Finished Incremental Garbage Collection\n",
+                collector = self.__collector, avail_list_length = self.__avail_list_length
+            )
+            self.__events.flush()
+
+    def __record_collection(self, kind, mark_time, sweep_time, live, freed):
+        self.__collections.append(
+            {
+                "kind": kind,
+                "mark_time": mark_time,
+                "sweep_time": sweep_time,
+                "live": live,
+                "freed": freed,
+                "avail_list_length": self.__avail_list_length,
+                "allocated": self.__allocated - self.__allocated_before_collection,
+            }
+        )
+        self.__allocated_before_collection = self.__allocated
+
+    def get_metrics(self):
+        """
+        Returns a dictionary with the memory size, the number of free nodes, the number of nodes allocated
+        since the memory was created and their rate (nodes per second), and a list of collections.
+        Each collection is a dictionary with:
+            "kind" of the collection: "full", "minor", "incremental" (a whole cycle) or "copying".
+            "mark_time" and "sweep_time" in seconds (a copying collection only has mark time).
+            "live" nodes found by marking (promoted nodes in a minor collection) and "freed" garbage nodes.
+            "avail_list_length" after the collection (garbage is only linked into it later by a lazy sweep).
+            "allocated" nodes since the previous collection.
+        """
+        elapsed = time.perf_counter() - self.__created
+        return {
+            "size": self.get_size(),
+            "free_nodes": self.get_free_node_count(),
+            "allocated": self.__allocated,
+            "allocation_rate": self.__allocated / elapsed if elapsed > 0 else 0.0,
+            "collections": [dict(collection) for collection in self.__collections],
+        }
+
+    def get_pauses(self):
+        """
+        Returns the recorded pauses in seconds, oldest first.
+        """
+        return list(self.__pauses)
+
+    def pause_histogram(self):
+        """
+        Returns (upper bound in microseconds, count) pairs for the recorded pauses
+        where bounds are consecutive powers of two.
+        """
+        counts = {}
+        for pause in self.__pauses:
+            bound = 1
+            while bound < pause * 1e6:
+                bound *= 2
+            counts[bound] = counts.get(bound, 0) + 1
+        if not counts:
+            return []
+        histogram = []
+        bound = min(counts)
+        while bound <= max(counts):
+            histogram.append((bound, counts.get(bound, 0)))
+            bound *= 2
+        return histogram
+
+    def __collect_young_generation(self, lists_roots):
+        # Only young nodes are marked, starting from the roots and from the old nodes of the remembered set,
+        # so the work depends on the number of young nodes and not on the memory size.
+        self.__events.emit("summary", "collection-started", "Starting Minor Garbage Collection\n", collector = self.__collector)
+        start = time.perf_counter()
+        generations = self.__generations
+        young_nodes = self.__young_nodes
+        for node in young_nodes:
+            self.__set_node_tag(node, False)
+        gray_nodes = [list_root.root for list_root in lists_roots]
+        for node in self.__remembered_set:
+            gray_nodes.append(self.get_node_next(node))
+            gray_nodes.append(self.get_node_down(node))
+        while gray_nodes:
+            node = gray_nodes.pop()
+            if node is None or generations[node >> 2] != Memory.YOUNG_GENERATION or self.__get_node_tag(node):
+                continue
+            self.__set_node_tag(node, True)
+            gray_nodes.append(self.get_node_next(node))
+            gray_nodes.append(self.get_node_down(node))
+        marked = time.perf_counter()
+        promoted = freed = 0
+        for node in young_nodes:
+            # Nodes which were freed (and maybe allocated again) are listed more than once.
+            if generations[node >> 2] != Memory.YOUNG_GENERATION:
+                continue
+            if self.__get_node_tag(node):
+                generations[node >> 2] = Memory.OLD_GENERATION
+                promoted += 1
+            else:
+                self.free_node(node)
+                freed += 1
+        young_nodes.clear()
+        self.__remembered_set.clear()
+        self.__record_collection("minor", marked - start, time.perf_counter() - marked, promoted, freed)
+        self.__events.emit(
+            "summary", "collection-finished", f"Finished Minor Garbage Collection ({promoted} promoted, {freed} freed)\n",
+            collector = self.__collector, promoted = promoted, freed = freed
+        )
+
+    def __sweep_lazily(self):
+        while self.__avail_list_head is None and self.__sweep_cursor < self.__sweep_limit:
+            end = min(self.__sweep_cursor + Memory.LAZY_SWEEP_CHUNK, self.__sweep_limit)
+            self.__sweep_range(self.__sweep_cursor, end)
+            self.__sweep_cursor = end
+
+    def __sweep_range(self, start, end):
+        # Same avail list as freeing garbage nodes from start to end one by one in increasing order:
+        # each garbage node points to the previous one and the last one becomes the head.
+        nexts = self.__nexts
+        previous = Memory.NULL if self.__avail_list_head is None else self.__avail_list_head
+        for run in Memory.__GARBAGE_RUN.finditer(self.__tags, start, end):
+            first, last = run.start(), run.end() - 1
+            nexts[first] = previous
+            if last > first:
+                nexts[first + 1:last + 1] = array(self.__labels.typecode, range(4 * first, 4 * last, 4))
+            previous = 4 * last
+            self.__avail_list_length += last - first + 1
+        self.__avail_list_head = None if previous == Memory.NULL else previous
 
     def __traverse_list_and_mark_tags(self, list_root):
         cur = list_root.root
         prev = None
         moving_backward = False
         ladder_used = False
-        print("list traversed: ", end="")
+        # traversed nodes are only written out at "per-node" level
+        nodes_text = [] if self.__events.traces("per-node") else None
+        traversed = 0
         while True:
             if cur is None:
                 prev, cur = cur, prev
                 moving_backward = True
             if not moving_backward:
                 self.__set_node_tag(cur, True)
+                traversed += 1
                 if self.get_node_down(cur) is not None and self.get_node_down(self.get_node_down(cur)) != cur:
-                    print("(", end="")
+                    if nodes_text is not None:
+                        nodes_text.append("(")
                     if not ladder_used:
                         # Store cur next node in temp to set in label.
                         # Useful when moving backward. This is only used when not in ladder mode
                         temp = self.get_node_next(cur)
                         # Reverse pointer between cur and prev
-                        self.set_node_next(cur, prev)                        
+                        self.__write_next(cur, prev)                        
                         # Set this label to find the right next node after cur when moving backward.
                         # This is only used when not in ladder mode
                         self.set_node_label(cur, temp)
@@ -132,7 +1144,7 @@ class Memory:
                         # This is a node with no child so we can't play with label.
                         # But its down pointer is None. So by setting this to the parent node we have a loop.
                         # We can detect this loop when moving backwards. So we can identify this node.
-                        self.set_node_down(down_node, cur)
+                        self.__write_down(down_node, cur)
                         # When moving with down pointer, we have to set ladder used.
                         # But here the node below us does not have a child
                         ladder_used = False
@@ -140,26 +1152,28 @@ class Memory:
                     prev = None
                 else:
                     # Simple moving next with reversing pointers
-                    print(self.get_node_label(cur), end="")
+                    if nodes_text is not None:
+                        nodes_text.append(str(self.get_node_label(cur)))
                     temp = self.get_node_next(cur)
-                    self.set_node_next(cur, prev)
+                    self.__write_next(cur, prev)
                     prev = cur
                     cur = temp
             else:
                 # Simple moving backward (actually next)
                 temp = self.get_node_next(cur)
-                self.set_node_next(cur, prev)
+                self.__write_next(cur, prev)
                 prev = cur
                 cur = temp
                 # Check if we have finished moving backward
                 if cur is None:
-                    print(")", end="")
+                    if nodes_text is not None:
+                        nodes_text.append(")")
                     moving_backward = False
                     # Now check if we have no child using that loop trick
                     if self.get_node_down(self.get_node_down(prev)) == prev:
                         # we have no child so we get father from down field
                         cur = self.get_node_down(prev)
-                        self.set_node_down(prev, None)
+                        self.__write_down(prev, None)
                     else:
                         # we have child so we get the father from label
                         cur = self.get_node_label(prev)
@@ -178,8 +1192,17 @@ class Memory:
                         temp = self.get_node_next(cur)
                         prev = cur
                         cur = temp
-                        self.set_node_next(prev, None)
-        print()
+                        self.__write_next(prev, None)
+        if nodes_text is not None:
+            nodes_text = "".join(nodes_text)
+            self.__events.emit(
+                "per-node", "list-traversed", f"list traversed: {nodes_text}\n",
+                root = list_root.root, traversed = traversed, nodes = nodes_text
+            )
+        self.__events.emit(
+            "per-list", "list-traversed", f"list traversed: root {list_root.root} ({traversed} nodes)\n",
+            replaced_by = "per-node", root = list_root.root, traversed = traversed
+        )
 
 
 class Stack:
@@ -208,73 +1231,216 @@ class Stack:
 
 
 class GeneralList:
+    # pieces of text written to the stream at once by write
+    WRITE_CHUNK = 4096
+    # a parenthesis, or a run of labels which become consecutive nodes of one sublist
+    __TOKEN = re.compile(r"[()]|[^()]+")
+
     def __init__(self, memory, root):
         self.__memory = memory
         self.root = root
+        self.__path_steps = {}  # "(" or "*" -> [node reached by the step, steps after it]
+        self.__path_ends = {}  # node expression without its last character -> entry of its last step
+        self.__steps_from = {}  # node -> (steps, step) pairs of cached steps which follow next or down of the node
 
     @classmethod
     def convert_expression_to_general_list(cls, memory: Memory, expression: str):
-        ptr_to_ptr, _ = cls.__convert_expression_to_general_list(memory, list(expression), 0)
-        return cls(memory, ptr_to_ptr)
-
-    @staticmethod
-    def __convert_expression_to_general_list(memory: Memory, expression: list, idx):
-        first_node = None
-        previous_node = first_node
-        while idx < len(expression):
-            if expression[idx] == "(":
-                new_node = memory.allocate_node()
-                if previous_node is not None:
-                    memory.set_node_next(previous_node, new_node)
-                else:
-                    first_node = new_node
-                previous_node = new_node
-                down_node, idx = GeneralList.__convert_expression_to_general_list(memory, expression, idx + 1)
-                memory.set_node_down(new_node, down_node)
-            elif expression[idx] == ")":
-                return first_node, idx + 1
+        """
+        Builds the list in one pass without recursion: nodes and their links are found first,
+        then all of them are allocated with a single Memory.allocate_nodes call.
+        Each character is a node: "(" starts a sublist node whose down is its first child and a label is a leaf.
+        """
+        labels, nexts, downs = [], [], []
+        parents = []  # positions of sublist nodes whose children are being read
+        previous = -1  # position of the last node read in the current sublist
+        position = 0  # of the next node
+        for token in GeneralList.__TOKEN.findall(expression):
+            if token == ")":
+                if not parents:
+                    break
+                previous = parents.pop()
+                continue
+            if previous != -1:
+                nexts[previous] = position
+            elif parents:
+                downs[parents[-1]] = position
+            if token == "(":
+                labels.append(None)
+                nexts.append(-1)
+                downs.append(-1)
+                parents.append(position)
+                previous = -1
+                position += 1
             else:
-                new_node = memory.allocate_node(new_label = expression[idx])
-                if previous_node is not None:
-                    memory.set_node_next(previous_node, new_node)
-                else:
-                    first_node = new_node
-                previous_node = new_node
-                idx += 1
-        return first_node, idx
+                length = len(token)
+                labels.extend(token)
+                nexts.extend(range(position + 1, position + length + 1))
+                nexts[-1] = -1
+                downs.extend([-1] * length)
+                position += length
+                previous = position - 1
+        if memory.is_hash_consing():
+            nodes = memory.intern_nodes(labels, nexts, downs)
+        else:
+            nodes = memory.allocate_nodes(labels, nexts, downs)
+        return cls(memory, nodes[0] if nodes else None)
 
     def find_node_by_expression(self, node_expression):
+        """
+        Steps of walked node expressions are cached in a prefix tree (each entry holds the node reached by a step and
+        the entries of the next steps), so only steps after the longest cached prefix are walked in memory.
+        Walking a whole expression again is a single lookup. Memory tells the list to forget steps whose pointers change.
+        """
+        memory = self.__memory
+        path = node_expression[:-1]
+        entry = self.__path_ends.get(path)
+        if entry is not None and entry[0] is not None:
+            return entry[0], memory.get_node_label(entry[0])
         ptr = self.root
-        for ch in node_expression[:-1]:
+        steps = self.__path_steps
+        for ch in path:
+            entry = None if steps is None else steps.get(ch)
+            if entry is not None:
+                ptr, steps = entry
+                continue
+            parent = ptr
             if ch == "(":
-                ptr = self.__memory.get_node_down(ptr)
+                ptr = memory.get_node_down(ptr)
             else:
-                ptr = self.__memory.get_node_next(ptr)
-        return ptr, self.__memory.get_node_label(ptr)
+                ptr = memory.get_node_next(ptr)
+            if steps is not None and ptr is not None:
+                entry = steps[ch] = [ptr, {}]
+                self.__steps_from.setdefault(parent, []).append((steps, ch))
+                memory.watch_node_pointers(parent, self)
+                steps = entry[1]
+            else:
+                steps = None  # nothing is cached past a missing node
+        if entry is not None:
+            self.__path_ends[path] = entry
+        return ptr, memory.get_node_label(ptr)
 
-    def __str__(self):
-        result = []
-        stack = Stack(self.__memory)
-        stack.push(self.root)
-        reached_end = False
-        while not stack.is_empty():
-            top = stack.top()
-            if reached_end:
-                stack.pop()
-                result.append(")")
-                if self.__memory.get_node_next(top) is not None:
-                    reached_end = False
-                    stack.push(self.__memory.get_node_next(top))
+    def find_node_to_change(self, node_expression):
+        """
+        Same as find_node_by_expression, except that a node shared by hash consing is copied first, so changing it
+        doesn't change other lists. Shared nodes only point to shared nodes, so the copied nodes are the ones from
+        the first shared node of the path to the found node. The copies are allocated at once and then linked into
+        the list in place of the shared nodes, and the list reads the same as before.
+        """
+        node, label = self.find_node_by_expression(node_expression)
+        memory = self.__memory
+        if node is None or not memory.is_shared(node):
+            return node, label
+        steps = node_expression[:-1]
+        path = [self.root]  # path[k + 1] is reached from path[k] by steps[k]
+        for ch in steps:
+            path.append(memory.get_node_down(path[-1]) if ch == "(" else memory.get_node_next(path[-1]))
+        first = 1  # roots are never shared
+        while not memory.is_shared(path[first]):
+            first += 1
+        shared_nodes = path[first:]
+        nexts, downs = [-1] * len(shared_nodes), [-1] * len(shared_nodes)
+        for k in range(len(shared_nodes) - 1):
+            if steps[first + k] == "(":
+                downs[k] = k + 1
+            else:
+                nexts[k] = k + 1
+        copies = memory.allocate_nodes([memory.get_node_label(node) for node in shared_nodes], nexts, downs)
+        for k, (node, copy) in enumerate(zip(shared_nodes, copies)):
+            # pointers off the path still lead to the shared nodes
+            if nexts[k] == -1 and memory.get_node_next(node) is not None:
+                memory.set_node_next(copy, memory.get_node_next(node))
+            if downs[k] == -1 and memory.get_node_down(node) is not None:
+                memory.set_node_down(copy, memory.get_node_down(node))
+        if steps[first - 1] == "(":
+            memory.set_node_down(path[first - 1], copies[0])
+        else:
+            memory.set_node_next(path[first - 1], copies[0])
+        return copies[-1], label
+
+    def unshare_first_node(self):
+        """
+        Returns the first node of the list (down of the root), copied first if it is shared by hash consing,
+        so changes of it through this list are seen by other lists which link it as their child.
+        """
+        first_node = self.__memory.get_node_down(self.root)
+        if first_node is None or not self.__memory.is_shared(first_node):
+            return first_node
+        return self.find_node_to_change("(*")[0]
+
+    def forget_paths_through(self, node):
+        """
+        Forgets cached steps which follow next or down of node, and the steps after them.
+        """
+        for steps, ch in self.__steps_from.pop(node, ()):
+            entry = steps.pop(ch, None)
+            entries = [] if entry is None else [entry]
+            while entries:
+                entry = entries.pop()
+                entry[0] = None  # expressions ending here are not valid in __path_ends anymore
+                entries.extend(entry[1].values())
+
+    def release_paths(self):
+        """
+        Forgets all cached steps and stops watching their nodes, e.g. when no variable is bound to the list anymore.
+        """
+        self.__memory.unwatch_node_pointers(self.__steps_from, self)
+        self.forget_paths()
+
+    def forget_paths(self):
+        self.__path_steps.clear()
+        self.__path_ends.clear()
+        self.__steps_from.clear()
+
+    def write(self, stream, max_depth = None, max_length = None):
+        """
+        Writes the list expression to stream (e.g. sys.stdout) while walking the list, in chunks of WRITE_CHUNK pieces.
+        Nothing is allocated in memory: the walk keeps the sublist nodes it is inside in a Python list, so the heap
+        under observation isn't changed and a nearly full memory can still be printed.
+        A sublist nested deeper than max_depth parentheses is written as "(...)", and after max_length nodes the
+        rest of the list is written as "..." (with the open parentheses closed).
+        A sublist node reached again inside itself (a cycle, e.g. made by Make ... With Root) is written as "(...)",
+        so cyclic lists end with the default limits too.
+        """
+        memory = self.__memory
+        chunk = []
+        parents = []  # sublist nodes whose children are being written
+        inside = set()  # the same nodes, to find cycles
+        node = self.root
+        written = 0
+        while True:
+            if len(chunk) >= GeneralList.WRITE_CHUNK:
+                stream.write("".join(chunk))
+                chunk.clear()
+            if node is None:  # end of a sublist
+                if not parents:
+                    break
+                chunk.append(")")
+                parent = parents.pop()
+                inside.discard(parent)
+                node = memory.get_node_next(parent)
                 continue
-            if self.__memory.get_node_down(top) is None:
-                label = self.__memory.get_node_label(top)
-                result.append("" if label is None else label)
-                stack.pop()
-                if self.__memory.get_node_next(top) is None:
-                    reached_end = True
-                else:
-                    stack.push(self.__memory.get_node_next(top))
+            if written == max_length:
+                chunk.append("...")
+                chunk.append(")" * len(parents))
+                break
+            written += 1
+            down = memory.get_node_down(node)
+            if down is None:
+                label = memory.get_node_label(node)
+                if label is not None:
+                    chunk.append(label)
+            elif max_depth is not None and len(parents) >= max_depth or node in inside:
+                chunk.append("(...)")
             else:
-                result.append("(")
-                stack.push(self.__memory.get_node_down(top))
-        return "".join(result)
+                chunk.append("(")
+                parents.append(node)
+                inside.add(node)
+                node = down
+                continue
+            node = memory.get_node_next(node)
+        stream.write("".join(chunk))
+
+    def __str__(self):
+        output = io.StringIO()
+        self.write(output)
+        return output.getvalue()
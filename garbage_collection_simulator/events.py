@@ -0,0 +1,50 @@
+import json
+import sys
+
+
+class EventSink:
+    # From the least to the most detailed.
+    LEVELS = ("silent", "summary", "per-list", "per-node")
+
+    def __init__(self, level = "per-node", trace = None, trace_level = "per-node"):
+        """
+        Receives events of garbage collection (and memory growth) from Memory and Interpreter.
+        Events up to level are written to standard output:
+            "silent" writes nothing.
+            "summary" writes when collections start and finish.
+            "per-list" also writes the root and the number of marked nodes of each traversed list.
+            "per-node" also writes every traversed node, like "list traversed: (a(b)c)".
+        Text is buffered and written at once when flush is called (at the end of each collection or collection step).
+        With trace (a file opened for writing), events up to trace_level are also written there as JSON lines,
+        whatever level standard output has.
+        """
+        for name in (level, trace_level):
+            if name not in EventSink.LEVELS:
+                raise ValueError(f"Expected one of following log levels: {EventSink.LEVELS}, got {name}.")
+        self.__level = EventSink.LEVELS.index(level)
+        self.__trace = trace
+        self.__buffer = []
+        # -1 when nothing is traced, so no event reaches the trace
+        self.__trace_level = -1 if trace is None else EventSink.LEVELS.index(trace_level)
+
+    def traces(self, level):
+        # Callers check this before preparing details of an event, e.g. the traversed nodes.
+        return EventSink.LEVELS.index(level) <= max(self.__level, self.__trace_level)
+
+    def emit(self, level, event, text, replaced_by = None, **fields):
+        """
+        Buffers text (a line) of the event if level is written to standard output and writes fields of the event
+        to the trace if level is traced there. With replaced_by (a more detailed level), outputs which take that level
+        are skipped, since they get a more detailed event instead.
+        """
+        index = EventSink.LEVELS.index(level)
+        limit = len(EventSink.LEVELS) if replaced_by is None else EventSink.LEVELS.index(replaced_by)
+        if index <= self.__level < limit:
+            self.__buffer.append(text)
+        if index <= self.__trace_level < limit:
+            self.__trace.write(json.dumps({"event": event, **fields}) + "\n")
+
+    def flush(self):
+        if self.__buffer:
+            sys.stdout.write("".join(self.__buffer))
+            self.__buffer.clear()
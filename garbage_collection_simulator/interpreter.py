@@ -1,61 +1,150 @@
-from garbage_collection_simulator.data_structures import Memory, GeneralList, Stack
-
-
-def make_child_by_variable_command(list1_name: str, list2_name: str, node_expression: str, memory: Memory, variables: dict):
+import math
+import sys
+from itertools import accumulate, repeat
+from garbage_collection_simulator.data_structures import Memory, GeneralList, NotEnoughMemoryNodesError
+from garbage_collection_simulator.events import EventSink
+from garbage_collection_simulator.snapshots import write_snapshot, open_snapshot
+
+PARENTHESIS_DEPTH_CHANGES = {"(": 1, ")": -1}  # other characters don't change the depth
+
+
+class VariableTable:
+    def __init__(self):
+        """
+        Variables of the interpreter. Each name gets a slot the first time it is bound and lists are kept by slot.
+        A list bound to several variables (after assignments between variables) is kept once with the number of
+        its bindings, so roots() gives each list once and collectors don't mark aliased lists again.
+        """
+        self.__slots = {}
+        self.__lists = []
+        self.__bindings = {}  # id of a bound list -> [list, number of variables bound to it]
+
+    def __get_slot(self, var_name: str):
+        slot = self.__slots.get(var_name)
+        if slot is None:
+            slot = self.__slots[var_name] = len(self.__lists)
+            self.__lists.append(None)
+        return slot
+
+    def __getitem__(self, var_name: str):
+        slot = self.__slots.get(var_name)
+        if slot is None:
+            raise KeyError(var_name)
+        return self.__lists[slot]
+
+    def bind(self, var_name: str, general_list: GeneralList, memory: Memory):
+        """
+        Binds the variable to the list. In reference counting mode a list is counted as one reference to its root
+        while any variable is bound to it. A list which loses its last variable releases its cached paths.
+        """
+        binding = self.__bindings.get(id(general_list))
+        if binding is None:
+            memory.retain(general_list.root)
+            binding = self.__bindings[id(general_list)] = [general_list, 0]
+        binding[1] += 1
+        slot = self.__get_slot(var_name)
+        old_list = self.__lists[slot]
+        self.__lists[slot] = general_list
+        if old_list is not None:
+            binding = self.__bindings[id(old_list)]
+            binding[1] -= 1
+            if binding[1] == 0:
+                del self.__bindings[id(old_list)]
+                old_list.release_paths()
+                memory.release(old_list.root)
+
+    def roots(self):
+        # each bound list once
+        return [general_list for general_list, _ in self.__bindings.values()]
+
+    def items(self):
+        return [(var_name, self.__lists[slot]) for var_name, slot in self.__slots.items()]
+
+
+def make_child_by_variable_command(list1_name: str, list2_name: str, node_expression: str, memory: Memory, variables: VariableTable):
     list1 = variables[list1_name]
     list2 = variables[list2_name]
-    node, _ = list2.find_node_by_expression(node_expression)
-    memory.set_node_down(node, memory.get_node_down(list1.root))
+    node, _ = list2.find_node_to_change(node_expression)
+    memory.set_node_down(node, list1.unshare_first_node())
 
 
-def make_child_by_variable_with_root_command(list1_name: str, list2_name: str, node_expression: str, memory: Memory, variables: dict):
+def make_child_by_variable_with_root_command(list1_name: str, list2_name: str, node_expression: str, memory: Memory, variables: VariableTable):
     list1 = variables[list1_name]
     list2 = variables[list2_name]
-    node, _ = list2.find_node_by_expression(node_expression)
+    node, _ = list2.find_node_to_change(node_expression)
     memory.set_node_down(node, list1.root)
 
 
-def make_child_by_list_expression_command(list_expression: str, list2_name: str, node_expression: str, memory: Memory, variables: dict):
+def make_child_by_list_expression_command(list_expression: str, list2_name: str, node_expression: str, memory: Memory, variables: VariableTable):
     list2 = variables[list2_name]
     list1 = GeneralList.convert_expression_to_general_list(memory, list_expression)
-    node, _ = list2.find_node_by_expression(node_expression)
+    node, _ = list2.find_node_to_change(node_expression)
     memory.set_node_down(node, memory.get_node_down(list1.root))
+    memory.release(list1.root)
 
 
-def make_child_by_list_expression_with_root_command(list_expression: str, list2_name: str, node_expression: str, memory: Memory, variables: dict):
+def make_child_by_list_expression_with_root_command(list_expression: str, list2_name: str, node_expression: str, memory: Memory, variables: VariableTable):
     list2 = variables[list2_name]
     list1 = GeneralList.convert_expression_to_general_list(memory, list_expression)
-    node, _ = list2.find_node_by_expression(node_expression)
+    node, _ = list2.find_node_to_change(node_expression)
     memory.set_node_down(node, list1.root)
 
 
-def delete_command(var_name: str, node_expression: str, memory: Memory, variables: dict):
+def delete_command(var_name: str, node_expression: str, memory: Memory, variables: VariableTable):
     general_list = variables[var_name]
-    node, _ = general_list.find_node_by_expression(node_expression)
+    node, _ = general_list.find_node_to_change(node_expression)
     memory.set_node_down(node, None)
 
 
-def print_command(var_name, variables: dict):
+def print_command(var_name, variables: VariableTable, max_depth = None, max_length = None, stream = None):
     general_list = variables[var_name]
-    print(general_list)
+    stream = sys.stdout if stream is None else stream
+    general_list.write(stream, max_depth, max_length)
+    stream.write("\n")
+
+
+def garbage_collect_command(memory: Memory, variables: VariableTable):
+    memory.garbage_collect(*variables.roots())
+
+
+def pause_histogram_command(memory: Memory):
+    for bound, count in memory.pause_histogram():
+        print(f"<= {bound} us: {count}")
 
 
-def garbage_collect_command(memory: Memory, variables: dict):
-    memory.garbage_collect(*variables.values())
+def stats_command(memory: Memory):
+    metrics = memory.get_metrics()
+    collections = metrics["collections"]
+    print(f"Memory: {metrics['size']} nodes, {metrics['free_nodes']} free")
+    print(f"Allocated: {metrics['allocated']} nodes ({metrics['allocation_rate']:.0f} per second)")
+    mark_time = sum(collection["mark_time"] for collection in collections)
+    sweep_time = sum(collection["sweep_time"] for collection in collections)
+    print(f"Collections: {len(collections)} (mark {mark_time * 1e3:.3f} ms, sweep {sweep_time * 1e3:.3f} ms)")
+    if collections:
+        last = collections[-1]
+        print(
+            f"Last collection: {last['kind']}, {last['live']} live, {last['freed']} freed, "
+            f"avail list of {last['avail_list_length']} nodes"
+        )
 
 
-def set_node_label_command(var_name1: str, node_expression: str, label: str, memory: Memory, variables: dict):
+def set_node_label_command(var_name1: str, node_expression: str, label: str, memory: Memory, variables: VariableTable):
     list1 = variables[var_name1]
-    node, _ = list1.find_node_by_expression(node_expression)
+    node, _ = list1.find_node_to_change(node_expression)
     memory.set_node_label(node, label)
 
 
-def assignment_command(var_name: str, list_expression: str, memory: Memory, variables: dict):
-    variables[var_name] = GeneralList.convert_expression_to_general_list(memory, list_expression)
+def bind_variable(var_name: str, general_list: GeneralList, memory: Memory, variables: VariableTable):
+    variables.bind(var_name, general_list, memory)
 
 
-def assignment_between_variables_command(var_name1: str, var_name2: str, variables: dict):
-    variables[var_name1] = variables[var_name2]
+def assignment_command(var_name: str, list_expression: str, memory: Memory, variables: VariableTable):
+    general_list = GeneralList.convert_expression_to_general_list(memory, list_expression)
+    bind_variable(var_name, general_list, memory, variables)
+
+
+def assignment_between_variables_command(var_name1: str, var_name2: str, memory: Memory, variables: VariableTable):
+    bind_variable(var_name1, variables[var_name2], memory, variables)
 
 
 class UndefinedSequenceError(SyntaxError):
@@ -83,20 +172,54 @@ def is_node_expression_valid(node_expression: str) -> bool:
     return True
 
 
-def is_list_expression_valid(list_expression: str) -> bool:
-    stack = Stack(Memory(len(list_expression)))
-    for ch in list_expression:
+def find_unbalanced_parenthesis(list_expression: str):
+    """
+    Returns the position of the first ")" which closes nothing, or else of the first "(" which is never closed.
+    Returns None if parentheses are balanced: depth never drops below zero and ends at zero.
+    Depths are summed up without a Python loop, only unbalanced expressions are scanned again to find the position.
+    """
+    depths = accumulate(map(PARENTHESIS_DEPTH_CHANGES.get, list_expression, repeat(0)))
+    if list_expression.count("(") == list_expression.count(")") and min(depths, default = 0) >= 0:
+        return None
+    open_parentheses = []
+    for position, ch in enumerate(list_expression):
         if ch == "(":
-            stack.push(ch)
+            open_parentheses.append(position)
         elif ch == ")":
-            if stack.is_empty():
-                return False
-            else:
-                stack.pop()
-    if stack.is_empty():
-        return True
-    else:
-        return False
+            if not open_parentheses:
+                return position
+            open_parentheses.pop()
+    return open_parentheses[0]
+
+
+def is_list_expression_valid(list_expression: str) -> bool:
+    return find_unbalanced_parenthesis(list_expression) is None
+
+
+def explain_list_expression(list_expression: str):
+    position = find_unbalanced_parenthesis(list_expression)
+    if position is not None:
+        return f"Unbalanced parenthesis at position {position}."
+    return None
+
+
+class ParserState:
+    def __init__(self, syntax: dict, controls: dict, explanations: dict):
+        """
+        A node of the syntax tree compiled once for the parser.
+        Children which are dictionaries become parser states too, executor tuples are kept as they are.
+        literals maps words to the next state and checks holds (validator, next state) pairs in the order of controls,
+        so the parser doesn't look for every control in the node for each word.
+        explanations are the functions of explanations (for controls of the node) which tell why a word is not valid.
+        """
+        children = {
+            word: ParserState(child, controls, explanations) if isinstance(child, dict) else child
+            for word, child in syntax.items()
+        }
+        self.literals = children
+        self.checks = tuple((valid, children[key]) for key, valid in controls.items() if key in syntax)
+        self.terms = syntax.keys()  # shown in syntax errors
+        self.explanations = tuple(explain for key, explain in explanations.items() if key in syntax)
 
 
 class Interpreter:
@@ -179,10 +302,12 @@ class Interpreter:
             "$VAR_NAME": (print_command, False, True)
         },
         "Garbage-Collect": (garbage_collect_command, True, True),
+        "Pause-Histogram": (pause_histogram_command, True, False),
+        "Stats": (stats_command, True, False),
         "$VAR_NAME": {
             "=": {
                 "$LIST_EXPRESSION": (assignment_command, True, True),
-                "$VAR_NAME": (assignment_between_variables_command, False, True)
+                "$VAR_NAME": (assignment_between_variables_command, True, True)
             }
         }
     }
@@ -192,37 +317,260 @@ class Interpreter:
         "$LIST_EXPRESSION": is_list_expression_valid,
         "$NODE_LABEL": is_node_label_valid
     }
-
-    def __init__(self, memory_size):
-        self.__memory = Memory(memory_size)
-        self.__variables = {}
-
-    def execute_command(self, command):
-        words = command.split()
-        kwargs = {}
+    # Functions which explain why a word is not valid for a control, or return None.
+    Explanations = {
+        "$LIST_EXPRESSION": explain_list_expression
+    }
+    Grammar = ParserState(Syntax, Controls, Explanations)
+
+    def __init__(self, memory_size, gc_threshold = None, growth_factor = None, max_live_fraction = 0.75, events = None,
+                 print_max_depth = None, print_max_length = None, **memory_options):
+        """
+        memory_options are passed to Memory, e.g. sweep or collector.
+        Garbage is collected automatically after a command which leaves less than gc_threshold free nodes.
+        If gc_threshold or growth_factor is given, a command which runs out of memory is retried after a collection.
+        Commands allocate all their nodes before changing any list, so retrying them is safe.
+        When growth_factor is given, memory grows by that factor after an automatic collection which leaves
+        more than max_live_fraction of memory live, or when a retried command runs out of memory again.
+        events (an EventSink) receives events of collections and memory growth.
+        Print writes sublists deeper than print_max_depth as "(...)" and stops after print_max_length nodes
+        (see GeneralList.write).
+        """
+        self.__events = EventSink() if events is None else events
+        self.__memory = Memory(memory_size, events = self.__events, **memory_options)
+        self.__variables = VariableTable()
+        self.__gc_threshold = gc_threshold
+        self.__growth_factor = growth_factor
+        self.__max_live_fraction = max_live_fraction
+        self.__print_limits = {"max_depth": print_max_depth, "max_length": print_max_length}
+
+    def __execute_with_retries(self, executor, args, kwargs):
+        free_nodes = None  # after the last collection
+        while True:
+            try:
+                executor(*args, **kwargs)
+                return
+            except NotEnoughMemoryNodesError:
+                if self.__gc_threshold is None and self.__growth_factor is None:
+                    raise
+                self.__collect_automatically(major = True, grow = free_nodes is not None)
+                if free_nodes is not None and self.__memory.get_free_node_count() <= free_nodes:
+                    raise
+                free_nodes = self.__memory.get_free_node_count()
+
+    def __collect_automatically(self, major = False, grow = False):
+        memory = self.__memory
+        memory.garbage_collect(*self.__variables.roots(), major = major)
+        while memory.collect_step():  # incremental collection is finished at once
+            pass
+        if self.__growth_factor is None:
+            return
+        size = memory.get_size()
+        if grow or size - memory.get_free_node_count() > self.__max_live_fraction * size:
+            memory.grow(math.ceil(size * self.__growth_factor))
+            if memory.get_size() == size:
+                # a copying memory using its upper semispace grows after copying into the lower one
+                memory.garbage_collect(*self.__variables.roots(), major = major)
+            self.__events.emit("summary", "memory-grown", f"Memory grew to {memory.get_size()} nodes\n", size = memory.get_size())
+            self.__events.flush()
+
+    def get_metrics(self):
+        """
+        Returns metrics of the memory (see Memory.get_metrics).
+        """
+        return self.__memory.get_metrics()
+
+    def get_pauses(self):
+        """
+        Returns pauses of collections in seconds (see Memory.get_pauses).
+        """
+        return self.__memory.get_pauses()
+
+    def close(self):
+        """
+        Frees the worker processes and shared memory of the memory (see Memory.close).
+        """
+        self.__memory.close()
+
+    def save_snapshot(self, file_path):
+        """
+        Writes the memory and the roots of variables to a snapshot file (see snapshots.write_snapshot).
+        """
+        fields, columns = self.__memory.export_state(*self.__variables.roots())
+        fields["variables"] = {var_name: general_list.root for var_name, general_list in self.__variables.items()}
+        try:
+            write_snapshot(file_path, fields, columns)
+        finally:
+            for column in columns.values():
+                column.release()
+
+    def load_snapshot(self, file_path):
+        """
+        Replaces the memory and the variables with the ones saved in a snapshot file.
+        The memory keeps its options (the snapshot should be taken with the same collector) and grows if the snapshot
+        holds more nodes. Variables which were bound to the same list are bound to one list again.
+        """
+        memory = self.__memory
+        with open_snapshot(file_path) as (fields, columns):
+            memory.import_state(fields, columns)
+        variables = VariableTable()
+        lists = {}  # root -> list
+        for var_name, root in fields["variables"].items():
+            if root not in lists:
+                lists[root] = GeneralList(memory, root)
+            variables.bind(var_name, lists[root], memory)
+        self.__variables = variables
+
+    @staticmethod
+    def parse_command(command):
+        """
+        Returns the executor of the command, its arguments and whether it needs memory and variables.
+        """
+        state = Interpreter.Grammar
         args = []
-        d = Interpreter.Syntax
-        for word in words:
-            if not isinstance(d, dict):
+        for word in command.split():
+            if not isinstance(state, ParserState):
                 raise SyntaxError(f"Expected line finished.")
-            if word not in d:
-                raise_error = True
-                for key, valid in Interpreter.Controls.items():
-                    if key in d:
-                        if valid(word):
-                            raise_error = False
-                            args.append(word)
-                            d = d[key]  # going deeper in the syntax tree
-                            break
-                if raise_error:
-                    raise SyntaxError(f"Expected one of following valid terms: {d.keys()}, got {word}.")
-            else:
-                d = d[word]  # going deeper in the syntax tree
-        if isinstance(d, tuple):  # d is the function
-            if d[1]:
-                kwargs["memory"] = self.__memory
-            if d[2]:
-                kwargs["variables"] = self.__variables
-            d[0](*args, **kwargs)  # execute command
+            next_state = state.literals.get(word)
+            if next_state is None:
+                for valid, next_state in state.checks:
+                    if valid(word):
+                        args.append(word)
+                        break
+                else:
+                    message = f"Expected one of following valid terms: {state.terms}, got {word}."
+                    for explain in state.explanations:
+                        explanation = explain(word)
+                        if explanation is not None:
+                            message = f"{message} {explanation}"
+                    raise SyntaxError(message)
+            state = next_state  # going deeper in the syntax tree
+        if isinstance(state, ParserState):
+            raise SyntaxError(f"Expected one of following valid terms: {state.terms}, got nothing.")
+        executor, needs_memory, needs_variables = state
+        return executor, args, needs_memory, needs_variables
+
+    def execute_command(self, command):
+        self.execute_parsed_command(*Interpreter.parse_command(command))
+
+    def execute_parsed_command(self, executor, args, needs_memory, needs_variables, **kwargs):
+        """
+        Executes a command returned by parse_command (or loaded from a compiled script) without parsing it again.
+        kwargs are passed to the executor too.
+        """
+        if needs_memory:
+            kwargs["memory"] = self.__memory
+        if needs_variables:
+            kwargs["variables"] = self.__variables
+        if executor is print_command:
+            kwargs = {**self.__print_limits, **kwargs}
+        self.__execute_with_retries(executor, args, kwargs)
+        if self.__memory.is_nursery_full():
+            garbage_collect_command(self.__memory, self.__variables)
+        elif self.__memory.is_collecting():
+            self.__memory.collect_step()
+        if self.__gc_threshold is not None and self.__memory.get_free_node_count() < self.__gc_threshold:
+            self.__collect_automatically()
+
+    @staticmethod
+    def __check(control, word):
+        # the same validation as parse_command does for a word of a command
+        if not isinstance(word, str) or not word or not Interpreter.Controls[control](word):
+            message = f"Expected a valid {control}, got {word!r}."
+            explain = Interpreter.Explanations.get(control)
+            explanation = None if explain is None or not isinstance(word, str) else explain(word)
+            if explanation is not None:
+                message = f"{message} {explanation}"
+            raise SyntaxError(message)
+
+    def assign(self, var_name, source):
+        """
+        Same as "var_name = source": source is a list expression if it starts with "(", else a variable name.
+        """
+        self.__check("$VAR_NAME", var_name)
+        if source[:1] == "(":
+            self.__check("$LIST_EXPRESSION", source)
+            self.execute_parsed_command(assignment_command, [var_name, source], True, True)
         else:
-            raise SyntaxError(f"Expected one of following valid terms: {d.keys()}, got nothing.")
+            self.__check("$VAR_NAME", source)
+            self.execute_parsed_command(assignment_between_variables_command, [var_name, source], True, True)
+
+    def make_child(self, source, var_name, node_expression, with_root = False):
+        """
+        Same as "Make source Child of var_name at node_expression With Root" (or "Without Root"):
+        source is a list expression if it starts with "(", else a variable name.
+        """
+        self.__check("$VAR_NAME", var_name)
+        self.__check("$NODE_EXPRESSION", node_expression)
+        if source[:1] == "(":
+            self.__check("$LIST_EXPRESSION", source)
+            executor = make_child_by_list_expression_with_root_command if with_root else make_child_by_list_expression_command
+        else:
+            self.__check("$VAR_NAME", source)
+            executor = make_child_by_variable_with_root_command if with_root else make_child_by_variable_command
+        self.execute_parsed_command(executor, [source, var_name, node_expression], True, True)
+
+    def delete(self, var_name, node_expression):
+        """
+        Same as "Delete var_name from node_expression".
+        """
+        self.__check("$VAR_NAME", var_name)
+        self.__check("$NODE_EXPRESSION", node_expression)
+        self.execute_parsed_command(delete_command, [var_name, node_expression], True, True)
+
+    def set_label(self, var_name, node_expression, label):
+        """
+        Same as "Set Label of var_name at node_expression to label".
+        """
+        self.__check("$VAR_NAME", var_name)
+        self.__check("$NODE_EXPRESSION", node_expression)
+        self.__check("$NODE_LABEL", label)
+        self.execute_parsed_command(set_node_label_command, [var_name, node_expression, label], True, True)
+
+    def collect(self):
+        """
+        Same as "Garbage-Collect".
+        """
+        self.execute_parsed_command(garbage_collect_command, [], True, True)
+
+    def print_list(self, var_name, stream = None):
+        """
+        Same as "Print var_name", written to stream (standard output by default) with the print limits of the interpreter.
+        """
+        self.__check("$VAR_NAME", var_name)
+        self.execute_parsed_command(print_command, [var_name], False, True, stream = stream)
+
+    # Operations which execute_many takes as tuples, with the method called for each.
+    BatchOperations = {
+        "assign": assign,
+        "make_child": make_child,
+        "delete": delete,
+        "set_label": set_label,
+        "collect": collect,
+        "print_list": print_list,
+    }
+
+    def execute_many(self, commands):
+        """
+        Executes commands one by one and returns (position, error) pairs of the commands which failed, positions
+        starting at 1. commands is a script (a string of lines) or an iterable whose items are command strings or
+        (operation, arguments...) tuples of BatchOperations, e.g. ("make_child", "a", "b", "(**", True),
+        which are executed without building and parsing a command string.
+        """
+        if isinstance(commands, str):
+            commands = commands.splitlines()
+        errors = []
+        for position, command in enumerate(commands, 1):
+            try:
+                if isinstance(command, str):
+                    self.execute_command(command)
+                else:
+                    operation = Interpreter.BatchOperations.get(command[0])
+                    if operation is None:
+                        raise ValueError(
+                            f"Expected one of following operations: {tuple(Interpreter.BatchOperations)}, got {command[0]}."
+                        )
+                    operation(self, *command[1:])
+            except Exception as err:
+                errors.append((position, err))
+        return errors
@@ -0,0 +1,115 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+NULL = -1
+# Blocks attached by this worker process and their views, kept until the memory gets new blocks.
+attached_columns = {"names": None, "blocks": [], "views": []}
+
+
+def attach_columns(names, typecode):
+    if attached_columns["names"] != names:
+        for view in attached_columns["views"]:
+            view.release()
+        for block in attached_columns["blocks"]:
+            block.close()
+        # Workers share the resource tracker of the parent process which unlinks the blocks.
+        blocks = [shared_memory.SharedMemory(name = name) for name in names]
+        attached_columns.update(
+            names = names, blocks = blocks,
+            views = [blocks[0].buf, blocks[1].buf.cast(typecode), blocks[2].buf.cast(typecode)]
+        )
+    return attached_columns["views"]
+
+
+def mark_reachable_nodes(names, typecode, roots):
+    """
+    Marks nodes reachable from roots in the tag block shared by all workers.
+    Workers may race on the same node but they only ever write the marked tag, so this is harmless.
+    Traversal does not change any pointer (unlike pointer reversal) since other workers read them at the same time.
+    """
+    tags, nexts, downs = attach_columns(names, typecode)
+    gray_nodes = list(roots)
+    marked = 0
+    while gray_nodes:
+        node = gray_nodes.pop()
+        if node < 0 or tags[node >> 2] == 2:
+            continue
+        tags[node >> 2] = 2
+        marked += 1
+        gray_nodes.append(nexts[node >> 2])
+        gray_nodes.append(downs[node >> 2])
+    return marked
+
+
+class ParallelMarker:
+    def __init__(self, workers):
+        """
+        Marks memory from many roots at once with a pool of worker processes.
+        Tag, next and down columns of the memory are views of shared memory blocks of the marker (see share_columns),
+        so workers mark the tags in place and nothing is copied for a collection.
+        """
+        self.__workers = workers
+        self.__pool = None
+        self.__blocks = []
+        self.__views = []
+
+    def share_columns(self, tags, nexts, downs, capacity, typecode):
+        """
+        Returns views of new shared memory blocks with room for capacity nodes, which hold tags, nexts and downs
+        (converted to typecode) followed by tags 0 and NULL pointers.
+        The blocks of the previous call are freed, so its views can't be used anymore.
+        """
+        itemsize = array(typecode).itemsize
+        blocks = [
+            shared_memory.SharedMemory(create = True, size = max(length, 1))
+            for length in (capacity, capacity * itemsize, capacity * itemsize)
+        ]
+        views = [
+            blocks[0].buf[:capacity],
+            blocks[1].buf[:capacity * itemsize].cast(typecode),
+            blocks[2].buf[:capacity * itemsize].cast(typecode),
+        ]
+        count = len(tags)
+        views[0][:count] = tags
+        for view, column in zip(views[1:], (nexts, downs)):
+            view[:count] = column if memoryview(column).format == typecode else array(typecode, column)
+            view[count:] = array(typecode, [NULL]) * (capacity - count)
+        self.__free_blocks()
+        self.__blocks, self.__views = blocks, views
+        return views
+
+    def __free_blocks(self):
+        for view in self.__views:
+            view.release()
+        for block in self.__blocks:
+            block.close()
+            block.unlink()
+        self.__blocks, self.__views = [], []
+
+    def mark(self, size, roots):
+        """
+        Marks (sets to 2) the tags of nodes from 0 to size which are reachable from roots, in the columns returned
+        by the last share_columns. Roots are split between the workers.
+        """
+        roots = list(roots)
+        if size == 0 or not roots:
+            return
+        if self.__pool is None:
+            self.__pool = ProcessPoolExecutor(self.__workers)
+        names = tuple(block.name for block in self.__blocks)
+        futures = [
+            self.__pool.submit(mark_reachable_nodes, names, self.__views[1].format, roots[i::self.__workers])
+            for i in range(min(self.__workers, len(roots)))
+        ]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        """
+        Stops the worker processes and frees the shared memory blocks.
+        """
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+        self.__free_blocks()
@@ -0,0 +1,73 @@
+import contextlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+SNAPSHOT_MAGIC = b"GCSNAP\r\n"
+# Bumped whenever the layout of snapshots changes, so older snapshots are rejected.
+SNAPSHOT_VERSION = 1
+# magic, version and length of the description which follows
+HEADER = struct.Struct("<8sII")
+# Columns start at multiples of this many bytes, so their items are aligned in the mapped file.
+ALIGNMENT = 8
+
+
+def align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_snapshot(file_path, fields: dict, columns: dict):
+    """
+    Writes a snapshot file: a header, a JSON description of fields and of the place of each column, then the columns.
+    Each column (a buffer, e.g. an array) is written in bulk with its raw bytes.
+    The file is written next to its final path and renamed, so a reader never sees a half written snapshot.
+    """
+    layout = {}
+    offset = 0
+    for name, column in columns.items():
+        with memoryview(column) as view:
+            layout[name] = (offset, view.nbytes)
+            offset = align(offset + view.nbytes)
+    description = json.dumps({"byteorder": sys.byteorder, "fields": fields, "columns": layout}).encode()
+    start = align(HEADER.size + len(description))
+    temporary_path = f"{file_path}.{os.getpid()}"
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(description)))
+        file.write(description)
+        for name, column in columns.items():
+            file.seek(start + layout[name][0])
+            file.write(column)
+        file.truncate(start + offset)
+    os.replace(temporary_path, file_path)
+
+
+@contextlib.contextmanager
+def open_snapshot(file_path):
+    """
+    Maps a snapshot file read-only and gives its fields and columns (memoryviews of the mapped file) within a with block.
+    Nothing is read until a column is used, and the pages of the file are shared by every process which maps it.
+    Raises ValueError if the file is not a snapshot of this version and byte order.
+    """
+    with open(file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size < HEADER.size:
+            raise ValueError(f"Expected a snapshot file, got {file_path}.")
+        with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            magic, version, description_length = HEADER.unpack_from(view)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Expected a snapshot file, got {file_path}.")
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Expected a snapshot of version {SNAPSHOT_VERSION}, got version {version}.")
+            description = json.loads(bytes(view[HEADER.size:HEADER.size + description_length]))
+            if description["byteorder"] != sys.byteorder:
+                raise ValueError(f"Expected a snapshot in {sys.byteorder} endian byte order, got {description['byteorder']}.")
+            start = align(HEADER.size + description_length)
+            columns = {
+                name: view[start + offset:start + offset + length] for name, (offset, length) in description["columns"].items()
+            }
+            try:
+                yield description["fields"], columns
+            finally:
+                for column in columns.values():
+                    column.release()  # the file can't be unmapped while views of it exist
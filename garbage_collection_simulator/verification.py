@@ -0,0 +1,171 @@
+import json
+import re
+import sys
+from array import array
+from garbage_collection_simulator.snapshots import open_snapshot
+
+NULL = -1
+# Colors of nodes while the verifier traverses lists: unreached, on the current path, traversed.
+WHITE, GRAY, BLACK = 0, 1, 2
+# Only this many errors are described in a report, the others are counted.
+MAX_ERRORS = 100
+GARBAGE_RUN = re.compile(b"\x01+")
+
+
+class HeapCorruptionError(RuntimeError):
+    pass
+
+
+def cast_column(column, typecode):
+    # columns of a mapped snapshot are bytes
+    view = memoryview(column)
+    return view if view.format == typecode else view.cast("B").cast(typecode)
+
+
+def verify_heap(fields, columns, roots):
+    """
+    Checks a heap given by fields and columns of Memory.export_state (or of a snapshot file) and the addresses of
+    the roots of its lists. Free nodes are found with one walk of the avail list, then the nodes reachable from
+    roots are traversed once without changing anything. Returns a report:
+        "nodes": nodes below the bump pointer (of the current semispace in copying mode), "free", "live" and "garbage"
+        (neither free nor reachable) nodes among them.
+        "roots": for each root, "nodes" first reached from it and "links" from them to nodes of earlier roots.
+        "shared_nodes": live nodes reached by more than one pointer or root, "cycles": pointers back to a node on
+        the path from a root (which Make ... With Root may create too, so they are not errors).
+        "reversed_links": live nodes with children whose label holds an address. Pointer reversal leaves them
+        after marking and only labels of nodes without children are valuable, so they are not errors.
+        "errors": descriptions of at most MAX_ERRORS errors and "error_count": dangling pointers (to addresses which
+        are not allocated nodes), reachable free nodes, nodes without children whose label holds an address
+        and an avail list which is not a chain of avail_list_length nodes.
+    """
+    typecode = fields["typecode"]
+    nodes = fields["nodes"]
+    first = fields["bump_limit"] - fields["semispace_size"] if fields["collector"] == "copying" else 0
+    views = [
+        cast_column(columns["tags"], "B"), cast_column(columns["labels"], typecode),
+        cast_column(columns["nexts"], typecode), cast_column(columns["downs"], typecode),
+    ]
+    tags, labels, nexts, downs = views
+    errors = []
+    error_count = 0
+
+    def report(error):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_ERRORS:
+            errors.append(error)
+
+    def is_node(pointer):
+        return pointer % 4 == 0 and first <= pointer >> 2 < nodes
+
+    try:
+        free = bytearray(nodes)  # 1 for free nodes
+        avail_list_length = 0
+        node = fields["avail_list_head"]
+        while node is not None and node != NULL:
+            if not is_node(node):
+                report(f"avail list reaches {node} which is not a node")
+                break
+            if free[node >> 2]:
+                report(f"avail list reaches node {node} again")
+                break
+            free[node >> 2] = 1
+            avail_list_length += 1
+            node = nexts[node >> 2]
+        if avail_list_length != fields["avail_list_length"]:
+            report(f"avail list has {avail_list_length} nodes instead of {fields['avail_list_length']}")
+        # garbage which a lazy sweep didn't reach yet
+        for run in GARBAGE_RUN.finditer(tags, fields["sweep_cursor"], fields["sweep_limit"]):
+            free[run.start():run.end()] = b"\x01" * (run.end() - run.start())
+        color = bytearray(nodes)
+        shared = bytearray(nodes)  # 1 for nodes reached again
+        owners = array("i", [-1]) * nodes  # index of the root which reached the node first
+        roots_report = []
+        cycles = 0
+        reachable_free = 0
+        reversed_links = 0
+        for index, root in enumerate(roots):
+            if not is_node(root):
+                report(f"root {root} is not a node")
+                roots_report.append({"root": root, "nodes": 0, "links": 0})
+                continue
+            owned = links = 0
+            stack = [root]
+            push = stack.append
+            while stack:
+                node = stack.pop()
+                if node < NULL:  # nodes under -node - 2 are traversed
+                    color[(-node - 2) >> 2] = BLACK
+                    continue
+                i = node >> 2
+                if color[i] != WHITE:
+                    shared[i] = 1
+                    if color[i] == GRAY:  # the path from the root is gray, so this pointer goes back to it
+                        cycles += 1
+                    elif owners[i] != index:
+                        links += 1
+                    continue
+                color[i] = GRAY
+                owners[i] = index
+                owned += 1
+                if free[i]:
+                    reachable_free += 1
+                    report(f"node {node} is reachable and free")
+                if labels[i] >= 0:
+                    if downs[i] == NULL:
+                        report(f"node {node} has no child and holds address {labels[i]} in its label")
+                    else:
+                        reversed_links += 1
+                push(-node - 2)
+                for pointer in (nexts[i], downs[i]):
+                    if pointer == NULL:
+                        continue
+                    if is_node(pointer):
+                        push(pointer)
+                    else:
+                        report(f"node {node} points to {pointer} which is not a node")
+            roots_report.append({"root": root, "nodes": owned, "links": links})
+        live = sum(root_report["nodes"] for root_report in roots_report)
+        free_count = free.count(1)
+        return {
+            "nodes": nodes - first,
+            "free": free_count,
+            "live": live,
+            "garbage": nodes - first - free_count - live + reachable_free,
+            "roots": roots_report,
+            "shared_nodes": shared.count(1),
+            "cycles": cycles,
+            "reversed_links": reversed_links,
+            "errors": errors,
+            "error_count": error_count,
+        }
+    finally:
+        for view in views:
+            view.release()
+
+
+def verify_snapshot(file_path):
+    """
+    Verifies the heap saved in a snapshot file, from the roots of its variables.
+    """
+    with open_snapshot(file_path) as (fields, columns):
+        return verify_heap(fields, columns, list(dict.fromkeys(fields["variables"].values())))
+
+
+def main(arguments):
+    """
+    Usage:
+        python3 -m garbage_collection_simulator.verification /path/to/snapshot [...]
+    Prints the report of each snapshot as JSON. The exit status is 1 if any heap has errors.
+    """
+    corrupted = False
+    for file_path in arguments:
+        report = verify_snapshot(file_path)
+        print(json.dumps({"snapshot": file_path, **report}, indent = 4))
+        corrupted = corrupted or report["error_count"] > 0
+    if corrupted:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,6 +1,85 @@
 from garbage_collection_simulator.interpreter import Interpreter
+from garbage_collection_simulator.events import EventSink
+from garbage_collection_simulator.compiler import compile_lines, load_script, execute_instructions
+import atexit
+import json
 import sys
-command_line_arguments = sys.argv[1:]
+
+
+def parse_switch(value):
+    if value not in ("on", "off"):
+        raise ValueError(f"Expected on or off, got {value}.")
+    return value == "on"
+
+
+# Options passed as --name=value to the interpreter (and its memory), with the argument name and its type.
+INTERPRETER_OPTIONS = {
+    "--sweep": ("sweep", str),
+    "--collector": ("collector", str),
+    "--nursery-size": ("nursery_size", int),
+    "--major-collection-interval": ("major_collection_interval", int),
+    "--step-budget": ("step_budget", int),
+    "--pause-target": ("pause_target", float),
+    "--gc-threshold": ("gc_threshold", int),
+    "--growth-factor": ("growth_factor", float),
+    "--max-live-fraction": ("max_live_fraction", float),
+    "--mark-workers": ("mark_workers", int),
+    "--hash-consing": ("hash_consing", parse_switch),
+    "--print-max-depth": ("print_max_depth", int),
+    "--print-max-length": ("print_max_length", int),
+    "--debug": ("debug", parse_switch),
+    "--gc-log": ("gc_log", str),
+    "--gc-trace": ("gc_trace", str),
+    "--gc-trace-level": ("gc_trace_level", str),
+    "--stats-file": ("stats_file", str),
+    "--load-snapshot": ("load_snapshot", str),
+    "--save-snapshot": ("save_snapshot", str),
+}
+# Executes a script while reading it, without compiling the whole script or caching it.
+STREAM_OPTION = "--stream"
+command_line_arguments = [
+    argument for argument in sys.argv[1:]
+    if argument.split("=")[0] not in INTERPRETER_OPTIONS and argument != STREAM_OPTION
+]
+
+
+def parse_interpreter_options():
+    interpreter_options = {}
+    for argument in sys.argv[1:]:
+        name, _, value = argument.partition("=")
+        if name in INTERPRETER_OPTIONS:
+            key, value_type = INTERPRETER_OPTIONS[name]
+            interpreter_options[key] = value_type(value)
+    return interpreter_options
+
+
+def write_stats(interpreter, file_path):
+    with open(file_path, "w") as file:
+        json.dump(interpreter.get_metrics(), file, indent = 4)
+
+
+def create_interpreter(memory_size, default_gc_log):
+    interpreter_options = parse_interpreter_options()
+    trace = None
+    if "gc_trace" in interpreter_options:
+        trace = open(interpreter_options.pop("gc_trace"), "w")
+        atexit.register(trace.close)
+    stats_file = interpreter_options.pop("stats_file", None)
+    load_snapshot = interpreter_options.pop("load_snapshot", None)
+    save_snapshot = interpreter_options.pop("save_snapshot", None)
+    events = EventSink(
+        interpreter_options.pop("gc_log", default_gc_log), trace, interpreter_options.pop("gc_trace_level", "per-node")
+    )
+    interpreter = Interpreter(memory_size, events = events, **interpreter_options)
+    # registered first, so it runs after saving the snapshot and the stats
+    atexit.register(interpreter.close)
+    if load_snapshot is not None:
+        interpreter.load_snapshot(load_snapshot)
+    if save_snapshot is not None:
+        atexit.register(interpreter.save_snapshot, save_snapshot)
+    if stats_file is not None:
+        atexit.register(write_stats, interpreter, stats_file)
+    return interpreter
 
 
 def show_help():
@@ -17,6 +96,32 @@ def show_help():
         Obviously "-x /path/to/file" could be replaced by "--execute /path/to/file". 
         Also "-i" could be replace by "--interactive-shell".
         Instead of "-m X" you can use "--memory-size=X". 
+        Memory could be configured with following options:
+            --sweep=eager, --sweep=batched or --sweep=lazy
+            --collector=mark-sweep, --collector=generational, --collector=incremental, --collector=copying
+                or --collector=reference-counting
+            --nursery-size=NUM and --major-collection-interval=NUM (generational collector)
+            --step-budget=NUM (nodes per step) and --pause-target=SECONDS (incremental collector)
+            --gc-threshold=NUM (collect garbage automatically when less than NUM nodes are free)
+            --growth-factor=NUM and --max-live-fraction=NUM (grow memory when it is too full after a collection)
+            --mark-workers=NUM (mark lists of different variables in NUM processes)
+            --hash-consing=on (identical sublists of list expressions share their nodes)
+            --print-max-depth=NUM and --print-max-length=NUM (Print writes deeper sublists as "(...)" and stops
+                after NUM nodes with "...")
+            --debug=on (verify the heap after every collection and stop with an error if it is corrupted)
+            --gc-log=silent, --gc-log=summary, --gc-log=per-list or --gc-log=per-node (what collections print,
+                "summary" when executing a file and "per-node" in the interactive shell by default)
+            --gc-trace=/path/to/file (also write collection events to the file as JSON lines) and
+                --gc-trace-level=summary, per-list or per-node (events written to the file, "per-node" by default)
+            --stats-file=/path/to/file (write metrics of allocations and collections to the file as JSON at exit)
+            --load-snapshot=/path/to/file (start from the memory and variables saved in a snapshot file)
+            --save-snapshot=/path/to/file (save the memory and variables to a snapshot file at exit)
+        Scripts are compiled and cached before execution. To execute a script while reading it use:
+            --stream
+        and to read the script from standard input (for example a pipe) pass "-" as the file path:
+            "$ cat hello.txt | python3 main.py -x -m 200 -"
+        For example:
+            "$ python3 main.py -x -m 200 --collector=incremental --step-budget=64 hello.txt"
         
     """)
 
@@ -34,7 +139,7 @@ def start_interactive_shell():
             if proceed_or_not == "n":
                 print("Execution terminated.")
                 return
-        interpreter = Interpreter(memory_size)
+        interpreter = create_interpreter(memory_size, "per-node")
         while True:
             cmd = input(">>> ")
             try:
@@ -43,6 +148,13 @@ def start_interactive_shell():
                 print(type(err), err)
     except IndexError:
         print("ERROR: Memory options not specified correctly. Use -m [memory size] or --memory-size=[memory size].")
+    except ValueError as err:
+        print("ERROR: Memory options not specified correctly.", err)
+
+
+def execute_and_report(interpreter, instructions):
+    for line_number, err in execute_instructions(interpreter, instructions):
+        print(f"Line number #{line_number}", type(err), err)
 
 
 def execute_file():
@@ -61,27 +173,26 @@ def execute_file():
             memory_size = int(command_line_arguments[1].split("=")[1])
         else:
             raise IndexError()
-        if memory_size > 100:
+        if memory_size > 100 and file_path != "-":  # stdin holds the script itself
             proceed_or_not = input(f"""
             You are going to allocate more than {memory_size} nodes or {4 * memory_size} cells. Are you sure? (y/n) """)
             if proceed_or_not == "n":
                 print("Execution terminated.")
                 return
-        file = open(file_path, "r")
-        lines = file.readlines()
-        file.close()
-        interpreter = Interpreter(memory_size)
-        line_number = 1
-        for line in lines:
-            try:
-                interpreter.execute_command(line[:-1])  # removing \n
-                line_number += 1
-            except Exception as err:
-                print(f"Line number #{line_number}", type(err), err)
+        interpreter = create_interpreter(memory_size, "summary")
+        if file_path == "-":
+            execute_and_report(interpreter, compile_lines(sys.stdin))
+        elif STREAM_OPTION in sys.argv:
+            with open(file_path, "r") as file:
+                execute_and_report(interpreter, compile_lines(file))
+        else:
+            execute_and_report(interpreter, load_script(file_path))
     except IndexError:
         print("ERROR: Memory options not specified correctly. Use -m [memory size] or --memory-size=[memory size].")
     except FileNotFoundError:
         print("ERROR: Module not found!")
+    except ValueError as err:
+        print("ERROR: Memory options not specified correctly.", err)
 
 
 print("Garbage Collection Simulator - 2020")
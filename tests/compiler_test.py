@@ -0,0 +1,87 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from garbage_collection_simulator.compiler import compile_lines, compile_script, execute_instructions, load_script, SYNTAX_ERROR, CACHE_DIRECTORY
+from garbage_collection_simulator.interpreter import Interpreter
+
+SCRIPT = [
+    "A = (a(b(c)d)ef(g)((i)h))",
+    "B = ((MN(P))Q(R)(ST(U)))",
+    "Make (XY(Z)) Child of B at ((** Without Root",
+    "Delete A",
+    "Set Label of B at (* to K",
+    "Print A",
+    "Print B",
+]
+
+
+def run_commands(commands):
+    interpreter = Interpreter(100)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for command in commands:
+            try:
+                interpreter.execute_command(command)
+            except Exception as err:
+                print(type(err), err)
+    return output.getvalue()
+
+
+def run_instructions(instructions):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for _, err in execute_instructions(Interpreter(100), instructions):
+            print(type(err), err)
+    return output.getvalue()
+
+
+class CompilerTest(unittest.TestCase):
+    def test_compiled_script_matches_interpreted_script(self):
+        instructions = compile_script(SCRIPT)
+        self.assertEqual([line_number for line_number, _, _ in instructions], list(range(1, len(SCRIPT) + 1)))
+        self.assertEqual(instructions[3][1], SYNTAX_ERROR)
+        self.assertEqual(run_instructions(instructions), run_commands(SCRIPT))
+
+    def test_errors_report_line_numbers(self):
+        instructions = compile_script(["A = (a)", "Print B", "Print", "Print A"])
+        errors = list(execute_instructions(Interpreter(100), instructions[:3]))
+        self.assertEqual([line_number for line_number, _ in errors], [2, 3])
+        self.assertIsInstance(errors[1][1], SyntaxError)
+
+    def test_compile_lines_streams_commands(self):
+        interpreter = Interpreter(100)
+        consumed = []
+
+        def read_lines():
+            for line in ["A = (ab)\n", "Print B\n", "Set Label of A at (* to K"]:
+                consumed.append(line)
+                yield line
+
+        executed = execute_instructions(interpreter, compile_lines(read_lines()))
+        line_number, err = next(executed)
+        self.assertEqual((line_number, type(err)), (2, KeyError))
+        self.assertEqual(len(consumed), 2)  # the rest of the script isn't read yet
+        self.assertEqual(list(executed), [])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            interpreter.execute_command("Print A")
+        self.assertEqual(output.getvalue(), "(Kb)\n")  # last line without newline is complete
+
+    def test_load_script_caches_compiled_script(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "script.txt")
+            with open(file_path, "w") as file:
+                file.write("\n".join(SCRIPT))
+            instructions = load_script(file_path)
+            self.assertEqual(len(os.listdir(os.path.join(directory, CACHE_DIRECTORY))), 1)
+            self.assertEqual(load_script(file_path), instructions)
+            with open(file_path, "a") as file:
+                file.write("\nPrint B")
+            self.assertEqual(len(load_script(file_path)), len(SCRIPT) + 1)
+            self.assertEqual(len(os.listdir(os.path.join(directory, CACHE_DIRECTORY))), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
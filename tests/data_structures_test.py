@@ -1,8 +1,20 @@
+import io
 import unittest
 from garbage_collection_simulator.data_structures import Memory, NotEnoughMemoryNodesError, \
     GeneralList, Stack, StackEmptyError
 
 
+def count_free_nodes(memory):
+    # allocates every free node, so memory should not be used afterwards
+    count = 0
+    while True:
+        try:
+            memory.allocate_node()
+        except NotEnoughMemoryNodesError:
+            return count
+        count += 1
+
+
 class MemoryTest(unittest.TestCase):
     def test_status(self):
         memory = Memory(4)
@@ -53,6 +65,44 @@ class MemoryTest(unittest.TestCase):
             ]
         )
 
+    def test_labels_store_characters_and_addresses(self):
+        memory = Memory(3)
+        node_a = memory.allocate_node(new_label = "A")
+        node_b = memory.allocate_node(new_label = node_a, new_down = node_a)
+        self.assertEqual(memory.get_node_label(node_a), "A")
+        self.assertEqual(memory.get_node_label(node_b), node_a)
+        self.assertEqual(memory.get_node_down(node_b), node_a)
+        self.assertIsNone(memory.get_node_next(node_b))
+        self.assertRaises(ValueError, memory.set_node_label, node_a, "AB")
+
+    def test_large_memory_is_initialized_lazily(self):
+        memory = Memory(10 ** 9)
+        node_a = memory.allocate_node(new_label = "A")
+        node_b = memory.allocate_node(new_label = "B", new_next = node_a)
+        memory.free_node(node_a)
+        self.assertEqual(memory.allocate_node(), node_a)  # freed nodes are reused before the bump pointer moves
+        self.assertEqual(memory.allocate_node(), node_b + 4)
+        self.assertEqual(memory.get_node_next(node_b), node_a)
+
+    def test_grow(self):
+        memory = Memory(4)
+        for _ in range(4):
+            memory.allocate_node()
+        memory.grow(6)
+        self.assertEqual(memory.get_free_node_count(), 2)
+        self.assertEqual(count_free_nodes(memory), 2)
+
+    def test_grow_copying_memory(self):
+        memory = Memory(10, collector = "copying")
+        list1 = GeneralList.convert_expression_to_general_list(memory, "(a(b)c)")
+        memory.garbage_collect(list1)  # the upper semispace is in use now
+        memory.grow(20)
+        self.assertEqual(memory.get_free_node_count(), 5)
+        memory.garbage_collect(list1)
+        self.assertEqual(memory.get_size(), 20)
+        self.assertEqual(str(list1), "(a(b)c)")
+        self.assertEqual(count_free_nodes(memory), 15)
+
     def test_allocate_node_raising_error(self):
         memory = Memory(5)
         for _ in range(5):
@@ -110,12 +160,260 @@ class GeneralListTest(unittest.TestCase):
         memory.garbage_collect(list2)
         print(list1, list2)
 
+    def test_batched_sweep_matches_eager_sweep(self):
+        statuses = []
+        for sweep in Memory.SWEEPS:
+            memory = Memory(60, sweep = sweep)
+            list1 = GeneralList.convert_expression_to_general_list(memory, "(a(b(c)d)e(AB(F)C)f)")
+            GeneralList.convert_expression_to_general_list(memory, "(x(y)z)")
+            list2 = GeneralList.convert_expression_to_general_list(memory, "((MN(P))Q)")
+            memory.garbage_collect(list1, list2)
+            statuses.append(memory.status())
+        self.assertEqual(statuses[0], statuses[1])
+
+    def test_lazy_sweep_on_allocation(self):
+        memory = Memory(20, sweep = "lazy")
+        list1 = GeneralList.convert_expression_to_general_list(memory, "(a(b)c)")
+        GeneralList.convert_expression_to_general_list(memory, "(defghijklmnopq)")
+        memory.garbage_collect(list1)  # memory is full and nothing is swept yet
+        self.assertEqual(str(list1), "(a(b)c)")
+        self.assertEqual(count_free_nodes(memory), 15)
+
+    def test_garbage_collection_rebuilds_avail_list(self):
+        memory = Memory(20)
+        list1 = GeneralList.convert_expression_to_general_list(memory, "(a(b)c)")
+        GeneralList.convert_expression_to_general_list(memory, "(xyz)")
+        memory.garbage_collect(list1)
+        self.assertEqual(str(list1), "(a(b)c)")
+        for _ in range(20 - 5):
+            memory.allocate_node()
+        self.assertRaises(NotEnoughMemoryNodesError, memory.allocate_node)
+
+    def test_minor_collection_keeps_nodes_referenced_by_old_nodes(self):
+        memory = Memory(40, collector = "generational")
+        list1 = GeneralList.convert_expression_to_general_list(memory, "(abc)")
+        memory.garbage_collect(list1)  # list1 is promoted to the old generation
+        GeneralList.convert_expression_to_general_list(memory, "(xy)")
+        list3 = GeneralList.convert_expression_to_general_list(memory, "(pq)")
+        node, _ = list1.find_node_by_expression("(**")
+        memory.set_node_down(node, list3.root)
+        memory.garbage_collect(list1)
+        self.assertEqual(str(list1), "(a((pq))c)")
+        self.assertEqual(count_free_nodes(memory), 40 - 7)
+
+    def test_old_garbage_is_freed_by_major_collection(self):
+        memory = Memory(20, collector = "generational", major_collection_interval = 3)
+        list1 = GeneralList.convert_expression_to_general_list(memory, "(abc)")
+        memory.garbage_collect(list1)
+        memory.garbage_collect()  # minor collection does not look at old nodes
+        self.assertEqual(str(list1), "(abc)")
+        memory.garbage_collect()  # third collection is major
+        self.assertEqual(count_free_nodes(memory), 20)
+
+    def test_incremental_collection_write_barrier(self):
+        memory = Memory(30, collector = "incremental", step_budget = 1)
+        list1 = GeneralList.convert_expression_to_general_list(memory, "(ab)")
+        list2 = GeneralList.convert_expression_to_general_list(memory, "(cd)")
+        memory.garbage_collect(list1)  # the first step blackens the root of list1
+        memory.set_node_down(list1.root, memory.get_node_down(list2.root))
+        while memory.collect_step():
+            pass
+        self.assertEqual(str(list1), "(cd)")
+        memory.garbage_collect(list1)
+        while memory.collect_step():
+            pass
+        self.assertEqual(count_free_nodes(memory), 30 - 3)
+
+    def test_incremental_collection_finishes_when_memory_is_full(self):
+        memory = Memory(10, collector = "incremental", step_budget = 1)
+        list1 = GeneralList.convert_expression_to_general_list(memory, "(ab)")
+        GeneralList.convert_expression_to_general_list(memory, "(cdefg)")
+        memory.garbage_collect(list1)
+        memory.allocate_node()
+        memory.allocate_node()  # the avail list is empty so the cycle is finished
+        self.assertFalse(memory.is_collecting())
+        self.assertEqual(str(list1), "(ab)")
+        self.assertEqual(sum(count for _, count in memory.pause_histogram()), 2)
+
+    def test_copying_collection(self):
+        memory = Memory(20, collector = "copying")
+        list1 = GeneralList.convert_expression_to_general_list(memory, "(a(b)c)")
+        GeneralList.convert_expression_to_general_list(memory, "(xyz)")
+        list2 = GeneralList.convert_expression_to_general_list(memory, "(pq)")
+        node, _ = list1.find_node_by_expression("(**")
+        memory.set_node_down(node, list2.root)
+        old_root = list1.root
+        memory.garbage_collect(list1, list2, list1)
+        self.assertNotEqual(list1.root, old_root)
+        self.assertEqual(str(list1), "(a((pq))c)")
+        self.assertEqual(str(list2), "(pq)")
+        node, _ = list1.find_node_by_expression("(**")
+        self.assertEqual(memory.get_node_down(node), list2.root)  # sharing is kept
+        self.assertEqual(count_free_nodes(memory), 20 - 7)
+
+    def test_collection_metrics(self):
+        for collector, kind, avail_list_length in (
+            ("mark-sweep", "full", 4), ("generational", "minor", 4), ("incremental", "incremental", 4), ("copying", "copying", 0)
+        ):
+            memory = Memory(20, collector = collector)
+            list1 = GeneralList.convert_expression_to_general_list(memory, "(a(b)c)")
+            GeneralList.convert_expression_to_general_list(memory, "(xyz)")
+            for _ in range(2):  # nothing is freed twice
+                memory.garbage_collect(list1)
+                while memory.collect_step():
+                    pass
+            metrics = memory.get_metrics()
+            self.assertEqual(metrics["allocated"], 9)
+            self.assertEqual(metrics["free_nodes"], 20 - 5)
+            first, second = metrics["collections"]
+            self.assertEqual(
+                (first["kind"], first["live"], first["freed"], first["avail_list_length"], first["allocated"]),
+                (kind, 5, 4, avail_list_length, 9)
+            )
+            self.assertEqual((second["freed"], second["allocated"]), (0, 0))
+            self.assertGreater(first["mark_time"], 0)
+
+    def test_reference_counting_frees_nodes_immediately(self):
+        memory = Memory(20, collector = "reference-counting")
+        list1 = GeneralList.convert_expression_to_general_list(memory, "(a(b)c)")
+        memory.retain(list1.root)
+        node, _ = list1.find_node_by_expression("(**")
+        child = memory.get_node_down(node)
+        memory.set_node_down(node, None)
+        self.assertEqual(memory.allocate_node(), child)
+        memory.free_node(child)
+        memory.release(list1.root)
+        self.assertEqual(count_free_nodes(memory), 20)
+
+    def test_reference_counting_cycles_are_freed_by_garbage_collection(self):
+        for collect in (False, True):
+            memory = Memory(20, collector = "reference-counting")
+            list1 = GeneralList.convert_expression_to_general_list(memory, "(ab)")
+            memory.retain(list1.root)
+            memory.set_node_down(memory.get_node_down(list1.root), list1.root)
+            memory.release(list1.root)
+            if collect:
+                memory.garbage_collect()
+            self.assertEqual(count_free_nodes(memory), 20 if collect else 17)
+
+    def test_parallel_mark_matches_serial_mark(self):
+        results = []
+        for mark_workers in (None, 2):
+            with Memory(100, mark_workers = mark_workers) as memory:
+                list1 = GeneralList.convert_expression_to_general_list(memory, "(a(b(c)d)e(AB(F)C)f)")
+                GeneralList.convert_expression_to_general_list(memory, "(x(y)z)")
+                list2 = GeneralList.convert_expression_to_general_list(memory, "((MN(P))Q)")
+                node, _ = list2.find_node_by_expression("(**")
+                memory.set_node_down(node, list1.root)
+                memory.garbage_collect(list1, list2, list2)
+                results.append(([tag for tag, _, _, _ in memory.status()], memory.get_free_node_count(), str(list2)))
+        self.assertEqual(results[0], results[1])
+
+    def test_closed_memory_marks_with_pointer_reversal(self):
+        memory = Memory(100, mark_workers = 2)
+        result_list = GeneralList.convert_expression_to_general_list(memory, "(a(b)c)")
+        GeneralList.convert_expression_to_general_list(memory, "(xyz)")
+        memory.garbage_collect(result_list)
+        memory.close()
+        memory.close()
+        GeneralList.convert_expression_to_general_list(memory, "(pq)")
+        memory.garbage_collect(result_list)
+        self.assertEqual(memory.get_free_node_count(), 95)
+        self.assertEqual(str(result_list), "(a(b)c)")
+
+    def test_parallel_mark_without_nodes(self):
+        with Memory(100, mark_workers = 2) as memory:
+            memory.garbage_collect()
+            self.assertEqual(memory.get_free_node_count(), 100)
+        memory.close()
+        self.assertEqual(str(GeneralList.convert_expression_to_general_list(memory, "(ab)")), "(ab)")
+
+    def test_convert_deep_expression_to_general_list(self):
+        memory = Memory(200000)
+        expression = "(" * 50000 + "a" + ")" * 50000
+        result_list = GeneralList.convert_expression_to_general_list(memory, expression)
+        self.assertEqual(result_list.find_node_by_expression("(" * 50000 + "*")[1], "a")
+        self.assertEqual(memory.get_free_node_count(), 200000 - 50001)
+
+    def test_convert_expression_to_general_list_allocates_all_or_nothing(self):
+        memory = Memory(10)
+        GeneralList.convert_expression_to_general_list(memory, "(abcd)")
+        self.assertRaises(NotEnoughMemoryNodesError, GeneralList.convert_expression_to_general_list, memory, "(abcde)")
+        self.assertEqual(memory.get_free_node_count(), 5)
+        result_list = GeneralList.convert_expression_to_general_list(memory, "(a(b)c)")
+        self.assertEqual(result_list.find_node_by_expression("(*(*")[1], "b")
+        self.assertEqual(memory.get_free_node_count(), 0)
+
     def test_find_node_by_expression(self):
         memory = Memory(100)
         result_list = GeneralList.convert_expression_to_general_list(memory, "(a(b(c)d)ef(g)((i)h))")
         _, actual = result_list.find_node_by_expression("(*(*(*")
         self.assertEqual(actual, "c")
 
+    def test_find_node_by_expression_after_changes(self):
+        for collector in ("mark-sweep", "copying"):
+            memory = Memory(100, collector = collector)
+            result_list = GeneralList.convert_expression_to_general_list(memory, "(a(b(c)d)ef(g)((i)h))")
+            self.assertEqual(result_list.find_node_by_expression("(*(*(*")[1], "c")
+            self.assertEqual(result_list.find_node_by_expression("(*(***")[1], "d")
+            node, _ = result_list.find_node_by_expression("(*(**")
+            new_list = GeneralList.convert_expression_to_general_list(memory, "(xy)")
+            memory.set_node_down(node, memory.get_node_down(new_list.root))
+            self.assertEqual(result_list.find_node_by_expression("(*(*(*")[1], "x")
+            self.assertEqual(result_list.find_node_by_expression("(*(***")[1], "d")
+            memory.set_node_next(node, None)
+            self.assertRaises(TypeError, result_list.find_node_by_expression, "(*(***")
+            memory.garbage_collect(result_list)
+            self.assertEqual(result_list.find_node_by_expression("(*(*(**")[1], "y")
+            self.assertEqual(result_list.find_node_by_expression("(*****(**")[1], "h")
+            self.assertEqual(str(result_list), "(a(b(xy))ef(g)((i)h))")
+
+    def test_hash_consing_shares_identical_sublists(self):
+        memory = Memory(100, hash_consing = True)
+        list1 = GeneralList.convert_expression_to_general_list(memory, "(a(bc)(bc))")
+        self.assertEqual(memory.get_free_node_count(), 100 - 6)  # the root, a, two sublist nodes and b, c once
+        list2 = GeneralList.convert_expression_to_general_list(memory, "(a(bc)(bc))")
+        self.assertEqual(memory.get_free_node_count(), 100 - 7)  # only a new root
+        self.assertNotEqual(list1.root, list2.root)
+        self.assertEqual(memory.get_node_down(list1.root), memory.get_node_down(list2.root))
+        self.assertEqual(str(list2), "(a(bc)(bc))")
+
+    def test_hash_consing_copies_shared_nodes_before_changes(self):
+        memory = Memory(100, hash_consing = True)
+        list1 = GeneralList.convert_expression_to_general_list(memory, "(a(bc)d)")
+        list2 = GeneralList.convert_expression_to_general_list(memory, "(a(bc)d)")
+        node, label = list1.find_node_to_change("(*(**")
+        self.assertEqual(label, "c")
+        self.assertFalse(memory.is_shared(node))
+        memory.set_node_label(node, "K")
+        self.assertEqual(str(list1), "(a(bK)d)")
+        self.assertEqual(str(list2), "(a(bc)d)")
+        # nodes off the copied path are still shared
+        self.assertEqual(list1.find_node_by_expression("(***")[0], list2.find_node_by_expression("(***")[0])
+
+    def test_write_general_list(self):
+        memory = Memory(8)
+        result_list = GeneralList.convert_expression_to_general_list(memory, "(a(b(c)d)e)")
+        self.assertEqual(memory.get_free_node_count(), 0)
+        output = io.StringIO()
+        result_list.write(output)  # allocates no node of the full memory
+        self.assertEqual(output.getvalue(), "(a(b(c)d)e)")
+        self.assertEqual(str(result_list), "(a(b(c)d)e)")
+        for max_depth, max_length, expected in ((1, None, "(a(...)e)"), (2, None, "(a(b(...)d)e)"), (None, 4, "(a(b...))")):
+            output = io.StringIO()
+            result_list.write(output, max_depth, max_length)
+            self.assertEqual(output.getvalue(), expected)
+
+    def test_write_cyclic_general_list(self):
+        memory = Memory(100)
+        result_list = GeneralList.convert_expression_to_general_list(memory, "(ab)")
+        node, _ = result_list.find_node_by_expression("(**")
+        memory.set_node_down(node, result_list.root)
+        for max_length, expected in ((None, "(a((...)))"), (7, "(a((...)))"), (2, "(a...)")):
+            output = io.StringIO()
+            result_list.write(output, max_length = max_length)
+            self.assertEqual(output.getvalue(), expected)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,54 @@
+import contextlib
+import io
+import json
+import unittest
+from garbage_collection_simulator.data_structures import Memory, GeneralList
+from garbage_collection_simulator.events import EventSink
+
+
+def collect_garbage(events):
+    memory = Memory(100, events = events)
+    list1 = GeneralList.convert_expression_to_general_list(memory, "(a(b(c)d)e)")
+    GeneralList.convert_expression_to_general_list(memory, "(xyz)")
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        memory.garbage_collect(list1)
+    return output.getvalue()
+
+
+class EventSinkTest(unittest.TestCase):
+    def test_levels(self):
+        self.assertEqual(collect_garbage(EventSink("silent")), "")
+        self.assertEqual(collect_garbage(EventSink("summary")), "Starting Garbage Collection\nFinished Garbage Collection\n")
+        self.assertEqual(
+            collect_garbage(EventSink("per-list")),
+            "Starting Garbage Collection\nlist traversed: root 0 (8 nodes)\nFinished Garbage Collection\n"
+        )
+        self.assertEqual(
+            collect_garbage(EventSink()),
+            "Starting Garbage Collection\nlist traversed: (a(b(c)d)e)\nFinished Garbage Collection\n"
+        )
+
+    def test_trace(self):
+        trace = io.StringIO()
+        collect_garbage(EventSink("per-list", trace))
+        events = [json.loads(line) for line in trace.getvalue().splitlines()]
+        self.assertEqual([event["event"] for event in events], ["collection-started", "list-traversed", "collection-finished"])
+        self.assertEqual(events[1]["traversed"], 8)
+        self.assertEqual(events[2]["avail_list_length"], 4)
+
+    def test_trace_of_silent_sink(self):
+        for trace_level, expected in (("per-node", "(a(b(c)d)e)"), ("per-list", None)):
+            trace = io.StringIO()
+            self.assertEqual(collect_garbage(EventSink("silent", trace, trace_level)), "")
+            events = [json.loads(line) for line in trace.getvalue().splitlines()]
+            self.assertEqual([event["event"] for event in events], ["collection-started", "list-traversed", "collection-finished"])
+            self.assertEqual(events[1].get("nodes"), expected)
+
+    def test_invalid_level(self):
+        self.assertRaises(ValueError, EventSink, "loud")
+        self.assertRaises(ValueError, EventSink, "summary", io.StringIO(), "loud")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,21 @@
+import contextlib
+import io
 import unittest
-from garbage_collection_simulator.interpreter import Interpreter
+import weakref
+from garbage_collection_simulator.data_structures import Memory, GeneralList, NotEnoughMemoryNodesError
+from garbage_collection_simulator.events import EventSink
+from garbage_collection_simulator.interpreter import Interpreter, VariableTable, PARENTHESIS_DEPTH_CHANGES, \
+    find_unbalanced_parenthesis
+
+
+def execute_silently(commands, memory_size, **options):
+    # returns the interpreter and what the commands printed, without collection logs
+    interpreter = Interpreter(memory_size, events = EventSink("silent"), **options)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for command in commands:
+            interpreter.execute_command(command)
+    return interpreter, output.getvalue()
 
 
 class InterpreterTest(unittest.TestCase):
@@ -43,6 +59,28 @@ class InterpreterTest(unittest.TestCase):
         i = Interpreter(100)
         self.assertRaises(SyntaxError, i.execute_command, "salam = ((*)(*))(8))")  # Invalid list expression raises error
 
+    def test_parse_command(self):
+        from garbage_collection_simulator.interpreter import make_child_by_list_expression_command, print_command
+        self.assertEqual(
+            Interpreter.parse_command("Make (ABC) Child of b at (** Without Root"),
+            (make_child_by_list_expression_command, ["(ABC)", "b", "(**"], True, True)
+        )
+        self.assertEqual(Interpreter.parse_command("Print b"), (print_command, ["b"], False, True))
+        with self.assertRaisesRegex(SyntaxError, r"Expected one of following valid terms: dict_keys\(\['Root'\]\), got nothing."):
+            Interpreter.parse_command("Make (ABC) Child of b at (** With")
+        with self.assertRaisesRegex(SyntaxError, "Expected line finished."):
+            Interpreter.parse_command("Print b c")
+
+    def test_find_unbalanced_parenthesis(self):
+        self.assertIsNone(find_unbalanced_parenthesis("((a)(b((c)d))ef)"))
+        self.assertIsNone(find_unbalanced_parenthesis("ab"))
+        self.assertEqual(find_unbalanced_parenthesis("((*)(*))(8))"), 11)
+        self.assertEqual(find_unbalanced_parenthesis(")("), 0)
+        self.assertEqual(find_unbalanced_parenthesis("(a)((b)(c"), 3)
+        self.assertEqual(PARENTHESIS_DEPTH_CHANGES, {"(": 1, ")": -1})  # other characters are not added
+        with self.assertRaisesRegex(SyntaxError, r"got \(\(b\)\. Unbalanced parenthesis at position 0\.$"):
+            Interpreter.parse_command("a = ((b)")
+
     def test_garbage_collect(self):
         i = Interpreter(100)
         i.execute_command("a = ((((Z)Y)X)TM(A(B(C))))")
@@ -58,5 +96,234 @@ class InterpreterTest(unittest.TestCase):
         i.execute_command("c = (B)")
         i.execute_command("Garbage-Collect")  # We can see that list c was garbage collected and returned to memory
 
+    def test_aliased_variables_are_marked_once(self):
+        i = Interpreter(100)
+        i.execute_command("a = ((V)PQ(R(S)))")
+        i.execute_command("b = a")
+        i.execute_command("c = b")
+        i.execute_command("d = (XY)")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            i.execute_command("Garbage-Collect")
+        self.assertEqual(output.getvalue().count("list traversed"), 2)
+
+    def test_rebound_variable_releases_its_list(self):
+        memory = Memory(100)
+        variables = VariableTable()
+        old_list = GeneralList.convert_expression_to_general_list(memory, "(a(b(c))d)")
+        variables.bind("a", old_list, memory)
+        node, _ = old_list.find_node_by_expression("(**")  # cached, so the memory watches its pointers
+        reference = weakref.ref(old_list)
+        del old_list
+        variables.bind("a", GeneralList.convert_expression_to_general_list(memory, "(a(b(c))d)"), memory)
+        self.assertIsNone(reference())
+        memory.set_node_next(node, None)
+
+    def test_generational_collector(self):
+        commands = (
+            ["a = ((((Z)Y)X)TM(A(B(C))))", "b = ((V)PQ(R(S)))"]  # nursery is full, so a minor collection runs
+            + ["c = (123(8)45(6(7)))"] * 5
+            + ["Make b Child of a at (*** Without Root", "Garbage-Collect", "Print a"]
+        )
+        i, output = execute_silently(
+            commands, 100, collector = "generational", nursery_size = 20, major_collection_interval = 2
+        )
+        self.assertEqual(output, "((((Z)Y)X)T((V)PQ(R(S)))(A(B(C))))\n")
+        self.assertGreater(len(i.get_metrics()["collections"]), 1)
+        mark_sweep, mark_sweep_output = execute_silently(commands, 100)
+        self.assertEqual(output, mark_sweep_output)
+        self.assertEqual(i.get_metrics()["free_nodes"], mark_sweep.get_metrics()["free_nodes"])
+
+    def test_incremental_collector(self):
+        commands = (
+            ["a = ((((Z)Y)X)TM(A(B(C))))", "b = ((V)PQ(R(S)))", "Garbage-Collect"]
+            + ["Make b Child of a at (*** Without Root"]
+            + ["b = (123(8)45(6(7)))"] * 5
+            + ["Print a"]
+        )
+        i, output = execute_silently(commands, 100, collector = "incremental", step_budget = 4)
+        self.assertEqual(output, "((((Z)Y)X)T((V)PQ(R(S)))(A(B(C))))\n")
+        self.assertEqual([collection["live"] for collection in i.get_metrics()["collections"]], [24])
+        self.assertGreater(len(i.get_pauses()), 1)  # the cycle ran in steps
+        mark_sweep, mark_sweep_output = execute_silently(commands, 100)
+        self.assertEqual(output, mark_sweep_output)
+        self.assertEqual(i.get_metrics()["free_nodes"], mark_sweep.get_metrics()["free_nodes"])
+        histogram = io.StringIO()
+        with contextlib.redirect_stdout(histogram):
+            i.execute_command("Pause-Histogram")
+        counts = [int(line.split(": ")[1]) for line in histogram.getvalue().splitlines()]
+        self.assertEqual(sum(counts), len(i.get_pauses()))
+
+    def test_copying_collector(self):
+        commands = (
+            ["a = ((((Z)Y)X)TM(A(B(C))))", "b = ((V)PQ(R(S)))", "Make b Child of a at (*** Without Root"]
+            + ["b = (D(E)(F(H))(G))", "Garbage-Collect"] * 3
+            + ["Set Label of a at (** to K", "Print a", "Print b"]
+        )
+        i, output = execute_silently(commands, 50, collector = "copying")
+        self.assertEqual(output, "((((Z)Y)X)K((V)PQ(R(S)))(A(B(C))))\n(D(E)(F(H))(G))\n")
+        self.assertEqual([collection["kind"] for collection in i.get_metrics()["collections"]], ["copying"] * 3)
+        mark_sweep, mark_sweep_output = execute_silently(commands, 50)
+        self.assertEqual(output, mark_sweep_output)
+        self.assertEqual(i.get_metrics()["free_nodes"], mark_sweep.get_metrics()["free_nodes"])
+
+    def test_reference_counting_collector(self):
+        commands = (
+            ["a = ((V)PQ(R(S)))", "b = a"]
+            + ["a = (123(8)45(6(7)))", "Make (XY) Child of a at (** Without Root", "Delete a from (****"] * 10
+            + ["Make b Child of b at (* With Root", "b = a", "Garbage-Collect", "Print b"]  # a cycle
+        )
+        i, output = execute_silently(commands, 40, collector = "reference-counting")
+        self.assertEqual(output, "(1(XY)345(6(7)))\n")
+        # without reference counting memory runs out, so mark-and-sweep gets more of it
+        self.assertRaises(NotEnoughMemoryNodesError, execute_silently, commands, 40)
+        mark_sweep, mark_sweep_output = execute_silently(commands, 200)
+        self.assertEqual(output, mark_sweep_output)
+        self.assertEqual(40 - i.get_metrics()["free_nodes"], 200 - mark_sweep.get_metrics()["free_nodes"])
+
+    def test_parallel_marking_before_any_list(self):
+        i, output = execute_silently(["Garbage-Collect", "a = (ab)", "Print a"], 100, mark_workers = 2)
+        i.close()
+        self.assertEqual(output, "(ab)\n")
+        self.assertEqual(i.get_metrics()["free_nodes"], 97)
+
+    def test_stats(self):
+        i = Interpreter(40, gc_threshold = 10)
+        i.execute_command("a = ((V)PQ(R(S)))")
+        for _ in range(5):
+            i.execute_command("b = (123(8)45(6(7)))")
+        i.execute_command("Stats")
+        metrics = i.get_metrics()
+        self.assertEqual(metrics["allocated"], 9 + 5 * 12)
+        self.assertTrue(metrics["collections"])
+
+    def test_hash_consing_keeps_lists_apart(self):
+        commands = [
+            "a = ((V)PQ(R(S)))",
+            "b = ((V)PQ(R(S)))",
+            "c = ((V)PQ(R(S)))",
+            "Make c Child of a at (** Without Root",
+            "Set Label of c at (** to K",
+            "Delete b from (***(**",
+            "Print a",
+            "Print b",
+            "Print c",
+        ]
+        free_nodes = []
+        for hash_consing in (False, True):
+            i = Interpreter(100, hash_consing = hash_consing, events = EventSink("silent"))
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                for command in commands:
+                    i.execute_command(command)
+            self.assertEqual(output.getvalue(), "((V)((V)KQ(R(S)))Q(R(S)))\n((V)PQ(R))\n((V)KQ(R(S)))\n")
+            free_nodes.append(i.get_metrics()["free_nodes"])
+        self.assertGreater(free_nodes[1], free_nodes[0])
+
+    def test_print_limits(self):
+        i = Interpreter(100, print_max_depth = 2, print_max_length = 8)
+        i.execute_command("a = ((V)P(Q(R(S))))")
+        i.execute_command("b = (abcdefghij)")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            i.execute_command("Print a")
+            i.execute_command("Print b")
+        self.assertEqual(output.getvalue(), "((V)P(Q(...)))\n(abcdefg...)\n")
+
+    def test_delete_after_garbage_collection(self):
+        # marking leaves an address in the label of the sublist node, which has no child after Delete
+        i = Interpreter(100, events = EventSink("silent"), debug = True)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for command in ("a = (a(b)c)", "Garbage-Collect", "Delete a from (**", "Garbage-Collect", "Print a"):
+                i.execute_command(command)
+        self.assertEqual(output.getvalue(), "(ac)\n")
+
+    def test_typed_commands(self):
+        commands = [
+            "a = ((V)PQ(R(S)))",
+            "b = a",
+            "c = (ABC)",
+            "Make c Child of a at (*** Without Root",
+            "Make (XY) Child of b at (**** With Root",
+            "Delete a from (*",
+            "Set Label of c at (** to K",
+            "Garbage-Collect",
+            "Print a",
+            "Print c",
+        ]
+        i = Interpreter(100, events = EventSink("silent"))
+        expected = io.StringIO()
+        with contextlib.redirect_stdout(expected):
+            for command in commands:
+                i.execute_command(command)
+        i = Interpreter(100, events = EventSink("silent"))
+        i.assign("a", "((V)PQ(R(S)))")
+        i.assign("b", "a")
+        i.assign("c", "(ABC)")
+        i.make_child("c", "a", "(***")
+        i.make_child("(XY)", "b", "(****", with_root = True)
+        i.delete("a", "(*")
+        i.set_label("c", "(**", "K")
+        i.collect()
+        output = io.StringIO()
+        i.print_list("a", output)
+        i.print_list("c", output)
+        self.assertEqual(output.getvalue(), expected.getvalue())
+        self.assertRaises(SyntaxError, i.assign, "a", "((V)")
+        self.assertRaises(SyntaxError, i.set_label, "a", "(*", "KL")
+
+    def test_execute_many(self):
+        i = Interpreter(100, events = EventSink("silent"))
+        errors = i.execute_many("a = (ab(c))\nb = (xy\nPrint b")
+        self.assertEqual([position for position, _ in errors], [2, 3])
+        self.assertIsInstance(errors[0][1], SyntaxError)
+        self.assertIsInstance(errors[1][1], KeyError)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            errors = i.execute_many(
+                [("make_child", "(pq)", "a", "(**(*"), "Print a", ("jump", "a"), ("print_list", "a"), ("delete", "a", "(**")]
+            )
+        self.assertEqual([position for position, _ in errors], [3])
+        self.assertIsInstance(errors[0][1], ValueError)
+        self.assertEqual(output.getvalue(), "(ab((pq)))\n(ab((pq)))\n")
+
+    def test_print_cyclic_list(self):
+        commands = ["a = (ab)", "Make a Child of a at (* With Root", "Print a"]
+        _, output = execute_silently(commands, 100)
+        self.assertEqual(output, "(((...))b)\n")
+
+    def test_automatic_garbage_collection(self):
+        commands = ["a = ((V)PQ(R(S)))"] + ["b = (123(8)45(6(7)))"] * 10 + ["Print a"]
+        i, output = execute_silently(commands, 40, gc_threshold = 10)
+        self.assertEqual(output, "((V)PQ(R(S)))\n")
+        metrics = i.get_metrics()
+        self.assertGreater(len(metrics["collections"]), 1)
+        self.assertEqual(metrics["size"], 40)  # collections alone were enough
+        self.assertEqual(metrics["free_nodes"], 19)
+
+    def test_automatic_garbage_collection_without_growth_raises(self):
+        i = Interpreter(20, gc_threshold = 5)
+        i.execute_command("a = ((V)PQ(R(S)))")
+        self.assertRaises(NotEnoughMemoryNodesError, i.execute_command, "b = (123(8)45(6(7)))")
+
+    def test_memory_growth(self):
+        commands = (
+            ["a = ((V)PQ(R(S)))"] + ["b = (123(8)45(6(7)(8(9(0)))))"] * 3
+            + ["Make b Child of a at (** With Root", "Print a"]
+        )
+        for collector in ("mark-sweep", "copying"):
+            i, output = execute_silently(commands, 10, growth_factor = 2, collector = collector)
+            self.assertEqual(output, "((V)((123(8)45(6(7)(8(9(0))))))Q(R(S)))\n")
+            metrics = i.get_metrics()
+            self.assertTrue(metrics["collections"])
+            self.assertEqual(metrics["size"], 80)  # doubled three times
+            self.assertEqual(metrics["free_nodes"], 17)
+            # the upper semispace is in use when the copying memory has to grow
+            late_commands = ["a = (abcdefgh)", "Garbage-Collect", "b = (abcdefghijklmnopqrs)", "Print b"]
+            i, output = execute_silently(late_commands, 10, growth_factor = 2, collector = collector)
+            self.assertEqual(output, "(abcdefghijklmnopqrs)\n")
+            self.assertEqual(i.get_metrics()["size"], 40)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,71 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from garbage_collection_simulator.events import EventSink
+from garbage_collection_simulator.interpreter import Interpreter
+from garbage_collection_simulator.snapshots import write_snapshot, open_snapshot
+
+SCRIPT = [
+    "A = (a(b(c)d)ef(g)((i)h))",
+    "B = ((MN(P))Q(R)(ST(U)))",
+    "C = B",
+    "D = (xyz)",
+    "D = (pq)",
+    "Make D Child of A at (** With Root",
+]
+
+
+def run_commands(interpreter, commands):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for command in commands:
+            interpreter.execute_command(command)
+    return output.getvalue()
+
+
+class SnapshotTest(unittest.TestCase):
+    def test_write_and_open_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "heap.snapshot")
+            write_snapshot(file_path, {"nodes": 3}, {"tags": b"\x01\x02", "labels": b"abcdefghijk"})
+            with open_snapshot(file_path) as (fields, columns):
+                self.assertEqual(fields, {"nodes": 3})
+                self.assertEqual(bytes(columns["tags"]), b"\x01\x02")
+                self.assertEqual(bytes(columns["labels"]), b"abcdefghijk")
+
+    def test_open_file_which_is_not_a_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "script.txt")
+            with open(file_path, "w") as file:
+                file.write("\n".join(SCRIPT))
+            with self.assertRaises(ValueError):
+                with open_snapshot(file_path):
+                    pass
+
+    def test_restored_interpreter_continues_the_session(self):
+        for collector in ("mark-sweep", "generational", "incremental", "copying", "reference-counting"):
+            interpreter = Interpreter(100, collector = collector, events = EventSink("silent"))
+            run_commands(interpreter, SCRIPT)
+            with tempfile.TemporaryDirectory() as directory:
+                file_path = os.path.join(directory, "heap.snapshot")
+                interpreter.save_snapshot(file_path)
+                restored = Interpreter(20, collector = collector, events = EventSink("silent"))
+                restored.load_snapshot(file_path)
+            commands = ["Garbage-Collect", "Set Label of C at (** to K", "Print A", "Print B", "D = (uvw)", "Print D"]
+            expected = run_commands(interpreter, commands)
+            self.assertEqual(run_commands(restored, commands), expected)
+            self.assertEqual(restored.get_metrics()["free_nodes"], interpreter.get_metrics()["free_nodes"])
+
+    def test_snapshot_of_another_collector_is_rejected(self):
+        interpreter = Interpreter(100, events = EventSink("silent"))
+        run_commands(interpreter, SCRIPT)
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "heap.snapshot")
+            interpreter.save_snapshot(file_path)
+            self.assertRaises(ValueError, Interpreter(100, collector = "copying").load_snapshot, file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from garbage_collection_simulator.data_structures import Memory, GeneralList
+from garbage_collection_simulator.events import EventSink
+from garbage_collection_simulator.interpreter import Interpreter
+from garbage_collection_simulator.verification import HeapCorruptionError, verify_snapshot
+
+
+class VerificationTest(unittest.TestCase):
+    def test_verify_heap(self):
+        for collector in ("mark-sweep", "generational", "incremental", "copying", "reference-counting"):
+            memory = Memory(100, collector = collector, events = EventSink("silent"))
+            list1 = GeneralList.convert_expression_to_general_list(memory, "(a(b)c)")
+            list2 = GeneralList.convert_expression_to_general_list(memory, "(pq)")
+            GeneralList.convert_expression_to_general_list(memory, "(xyz)")  # garbage
+            node, _ = list2.find_node_by_expression("(**")
+            memory.set_node_down(node, list1.root)
+            node, _ = list1.find_node_by_expression("(***")
+            memory.set_node_down(node, list1.root)  # a cycle
+            report = memory.verify(list1, list2)
+            self.assertEqual(report["errors"], [])
+            self.assertEqual(report["live"], 8)
+            self.assertEqual(report["garbage"] + report["free"], report["nodes"] - 8)
+            self.assertEqual([root["nodes"] for root in report["roots"]], [5, 3])
+            self.assertEqual(report["roots"][1]["links"], 1)
+            self.assertEqual(report["shared_nodes"], 1)
+            self.assertEqual(report["cycles"], 1)
+
+    def test_verify_heap_finds_errors(self):
+        memory = Memory(100)
+        result_list = GeneralList.convert_expression_to_general_list(memory, "(a(b)cd)")
+        node, _ = result_list.find_node_by_expression("(*(*")
+        memory.set_node_next(node, 4 * 1000)
+        node, _ = result_list.find_node_by_expression("(***")
+        memory.set_node_label(node, result_list.root)
+        node, _ = result_list.find_node_by_expression("(****")
+        memory.free_node(node)
+        report = memory.verify(result_list)
+        self.assertEqual(report["error_count"], 3)
+        self.assertCountEqual(
+            report["errors"],
+            [
+                f"node {node} is reachable and free",
+                f"node {node - 4} has no child and holds address {result_list.root} in its label",
+                f"node {result_list.find_node_by_expression('(*(*')[0]} points to 4000 which is not a node",
+            ]
+        )
+
+    def test_debug_mode_verifies_collections(self):
+        for collector in ("mark-sweep", "incremental", "copying"):
+            memory = Memory(100, collector = collector, events = EventSink("silent"), debug = True)
+            result_list = GeneralList.convert_expression_to_general_list(memory, "(a(b)c)")
+            memory.garbage_collect(result_list)
+            while memory.collect_step():
+                pass
+            node, _ = result_list.find_node_by_expression("(*(*")
+            memory.set_node_label(node, result_list.root)
+            with self.assertRaises(HeapCorruptionError):
+                memory.garbage_collect(result_list)
+                while memory.collect_step():
+                    pass
+
+    def test_verify_snapshot(self):
+        interpreter = Interpreter(100, events = EventSink("silent"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            commands = ("a = (a(b)c)", "b = a", "c = (pq)", "Make a Child of c at (** With Root", "d = (xyz)", "d = a")
+            for command in commands + ("Garbage-Collect",):
+                interpreter.execute_command(command)
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "heap.snapshot")
+            interpreter.save_snapshot(file_path)
+            report = verify_snapshot(file_path)
+        self.assertEqual(report["error_count"], 0)
+        self.assertEqual(report["live"], 8)
+        self.assertEqual(report["free"], 4)
+        self.assertEqual(report["roots"][1]["links"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()